@@ -0,0 +1,269 @@
+"""Offline bulk scoring of order files with the saved model.
+
+    python batch_score.py orders.csv predictions.csv [--workers N] [--engine numpy|keras]
+
+The input (CSV or Parquet) is cut into chunks that worker processes read
+and score on their own: byte ranges split on line boundaries for CSV, row
+groups for Parquet. The parent process only sees the predictions. At most
+``--max-pending`` chunks are in flight, and results are written in input
+order, so memory stays bounded however large the file is.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model_search import limit_threads, worker_threads
+from order_features import parse_created_at, conform_categoricals
+from runtime_stats import peak_rss_mb
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREDICTION_COLUMN = 'predicted_delivery_time_minutes'
+TIME_FEATURES = ('order_hour', 'order_dayofweek')
+
+# Per-worker state, set up once by init_worker
+_model = None
+_preprocessor = None
+_input_columns = None
+
+
+def default_model_dir():
+    """The directory the API serves by default: models/CURRENT, else backend/."""
+    pointer = os.path.join(BASE_DIR, 'models', 'CURRENT')
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            return os.path.join(BASE_DIR, 'models', f.read().strip())
+    return BASE_DIR
+
+
+def default_engine(model_dir):
+    """NumPy when ``model_dir`` has model.npz, so workers do not import TensorFlow."""
+    return 'numpy' if os.path.exists(os.path.join(model_dir, 'model.npz')) else 'keras'
+
+
+def load_model(model_dir, engine):
+    """(model, preprocessor) from ``model_dir``, as the API loads them in dev mode."""
+    import joblib
+    from embedding_model import load_vocabulary, KerasEmbeddingModel, NumpyEmbeddingModel
+    from fast_preprocess import CompiledPreprocessor
+    from numpy_model import NumpyDenseModel
+
+    vocabulary = load_vocabulary(model_dir)
+    if engine == 'numpy':
+        path = os.path.join(model_dir, 'model.npz')
+        model = (NumpyEmbeddingModel.load(path, vocabulary) if vocabulary is not None
+                 else NumpyDenseModel.load(path))
+    else:
+        from tensorflow import keras
+        model = keras.models.load_model(os.path.join(model_dir, 'model.keras'))
+        if vocabulary is not None:
+            model = KerasEmbeddingModel(model, vocabulary)
+
+    preprocessor = joblib.load(os.path.join(model_dir, 'preprocessor.joblib'))
+    try:
+        preprocessor = CompiledPreprocessor(preprocessor)
+    except ValueError:
+        pass  # the sklearn transform works on the chunk DataFrame as well
+    return model, preprocessor
+
+
+def model_input_columns(preprocessor):
+    """Raw columns the model needs from the input file (time features are derived)."""
+    if hasattr(preprocessor, 'feature_names_in_'):
+        names = list(preprocessor.feature_names_in_)
+    else:
+        names = preprocessor.numeric_features + preprocessor.categorical_features
+    return [c for c in names if c not in TIME_FEATURES] + ['created_at']
+
+
+def init_worker(model_dir, engine, threads):
+    global _model, _preprocessor, _input_columns
+    limit_threads(threads)
+    _model, _preprocessor = load_model(model_dir, engine)
+    _input_columns = model_input_columns(_preprocessor)
+
+
+def csv_chunks(path, chunk_bytes):
+    """(header, [(start, end), ...]) byte ranges of ``path`` that end on a line break."""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        ranges, start = [], f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def read_chunk(path, chunk, columns, keep_columns):
+    """Load one chunk: ``(header, start, end)`` for CSV or a row group index for Parquet."""
+    wanted = list(dict.fromkeys(columns + keep_columns))
+    if isinstance(chunk, int):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        present = parquet.schema_arrow.names
+        df = parquet.read_row_group(chunk, columns=[c for c in wanted if c in present]).to_pandas()
+    else:
+        header, start, end = chunk
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        df = pd.read_csv(io.BytesIO(header + data), usecols=lambda c: c.strip() in wanted)
+        df.columns = df.columns.str.strip()
+    missing = [c for c in wanted if c not in df.columns]
+    if missing:
+        raise ValueError(f"{path} is missing columns {missing}")
+    return df
+
+
+def score_chunk(path, chunk, keep_columns):
+    """Score one chunk in a worker; returns (output frame, stats)."""
+    started = time.perf_counter()
+    df = read_chunk(path, chunk, _input_columns, keep_columns)
+
+    # Same feature engineering as /predict: hour and day of week of created_at
+    hours, dayofweeks, errors = parse_created_at(df['created_at'].tolist())
+    features = [c for c in _input_columns if c != 'created_at']
+    ok = np.array([e is None for e in errors]) & df[features].notna().all(axis=1).to_numpy()
+
+    predictions = np.full(len(df), np.nan)
+    if ok.any():
+        # Categoricals as the preprocessor was fitted, whatever type the file stores (as /predict does)
+        rows = conform_categoricals(df.loc[ok, features], _preprocessor)
+        rows['order_hour'] = hours[ok]
+        rows['order_dayofweek'] = dayofweeks[ok]
+        X = _preprocessor.transform(rows)
+        predictions[ok] = _model.predict(X, batch_size=8192, verbose=0)[:, 0]
+
+    out = df[keep_columns].reset_index(drop=True)
+    out[PREDICTION_COLUMN] = predictions
+    return out, {'rows': len(df), 'failed': int((~ok).sum()), 'seconds': time.perf_counter() - started,
+                 'pid': os.getpid()}
+
+
+class OutputWriter:
+    """Appends frames to a CSV or Parquet file, written to ``path.tmp`` and renamed on close.
+
+    If nothing was written, ``close`` writes an empty file with ``columns``.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.tmp = path + '.tmp'
+        self.parquet = path.endswith('.parquet')
+        self.columns = columns
+        self._writer = None
+        self._header = True
+        self._written = False
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.tmp, table.schema, compression='zstd')
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.tmp, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+        self._written = True
+
+    def close(self):
+        if not self._written:
+            self.write(pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in self.columns.items()}))
+        if self._writer is not None:
+            self._writer.close()
+        os.replace(self.tmp, self.path)
+
+
+def score_file(input_path, output_path, model_dir=None, engine=None, workers=None, threads=1,
+               chunk_mb=16.0, max_pending=None, keep_columns=()):
+    """Score ``input_path`` into ``output_path``; returns the run's stats."""
+    model_dir = model_dir or default_model_dir()
+    engine = engine or default_engine(model_dir)
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    max_pending = max_pending or 2 * workers
+    keep_columns = list(keep_columns)
+
+    if input_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        chunks = list(range(pq.ParquetFile(input_path).num_row_groups))
+    else:
+        header, ranges = csv_chunks(input_path, int(chunk_mb * 2**20))
+        chunks = [(header, start, end) for start, end in ranges]
+    print(f"Scoring {input_path} with {model_dir} ({engine} engine): {len(chunks)} chunks, "
+          f"{workers} workers x {threads} threads")
+
+    started = time.perf_counter()
+    total = {'rows': 0, 'failed': 0, 'chunks': len(chunks)}
+    columns = dict({'row': 'int64'}, **{c: 'object' for c in keep_columns}, **{PREDICTION_COLUMN: 'float64'})
+    writer = OutputWriter(output_path, columns)
+    context = multiprocessing.get_context('spawn')
+    # Thread caps go in the workers' environment: they import numpy before init_worker runs
+    with worker_threads(threads), ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                                                      initargs=(model_dir, engine, threads)) as pool:
+        pending = deque()
+        queue = iter(enumerate(chunks))
+
+        def submit_next():
+            item = next(queue, None)
+            if item is not None:
+                pending.append((item[0], pool.submit(score_chunk, input_path, item[1], keep_columns)))
+
+        for _ in range(max_pending):
+            submit_next()
+        while pending:
+            index, future = pending.popleft()
+            out, stats = future.result()
+            out.insert(0, 'row', np.arange(total['rows'], total['rows'] + len(out)))
+            writer.write(out)
+            total['rows'] += stats['rows']
+            total['failed'] += stats['failed']
+            elapsed = time.perf_counter() - started
+            print(f"chunk {index + 1}/{len(chunks)}: {stats['rows']} rows in {stats['seconds']:.2f}s "
+                  f"(pid {stats['pid']}), {stats['failed']} unscored; "
+                  f"total {total['rows']} rows, {total['rows'] / elapsed:.0f} rows/s")
+            submit_next()
+    writer.close()
+
+    total['seconds'] = round(time.perf_counter() - started, 2)
+    total['rows_per_s'] = round(total['rows'] / max(total['seconds'], 1e-9), 1)
+    total['workers'] = workers
+    total['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    print(f"Scored {total['rows']} rows ({total['failed']} unscored) in {total['seconds']:.2f}s, "
+          f"{total['rows_per_s']:.0f} rows/s -> {output_path}")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score an order file (CSV or Parquet) with the saved model")
+    parser.add_argument('input')
+    parser.add_argument('output', help="CSV, or Parquet if it ends in .parquet")
+    parser.add_argument('--model-dir', default=None, help="Default: models/CURRENT if set, else backend/")
+    parser.add_argument('--engine', choices=['keras', 'numpy'], default=None,
+                        help="Default: numpy if the model dir has model.npz, else keras")
+    parser.add_argument('--workers', type=int, default=None, help="Default: cpu_count // threads-per-worker")
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--chunk-mb', type=float, default=16.0, help="CSV bytes per chunk (Parquet: one row group)")
+    parser.add_argument('--max-pending', type=int, default=None, help="Chunks in flight (default 2 x workers)")
+    parser.add_argument('--keep-columns', default='', help="Comma-separated input columns to copy to the output")
+    parser.add_argument('--stats-json', metavar='PATH', default=None)
+    args = parser.parse_args()
+
+    stats = score_file(args.input, args.output, args.model_dir, args.engine, args.workers,
+                       args.threads_per_worker, args.chunk_mb, args.max_pending,
+                       [c for c in args.keep_columns.split(',') if c])
+    if args.stats_json:
+        with open(args.stats_json, 'w') as f:
+            json.dump(stats, f, indent=2)
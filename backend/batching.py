@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item requests into batched calls.
+
+    Callers ``await submit(item)``. Pending items are flushed as one call to
+    ``batch_fn(items)`` when ``max_batch_size`` items are queued or when the
+    oldest one has waited ``max_wait_ms``. ``batch_fn`` runs on a dedicated
+    worker thread and must return one result per item, in order; an
+    ``Exception`` instance in the result list is raised to that caller only.
+    The worker thread is started on first use and stopped by ``close``, so
+    one batcher can serve several event loops (e.g. app restarts) in turn.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=64, max_wait_ms=3.0, workers=1):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.workers = workers
+        self._executor = None
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush, loop)
+
+        return await future
+
+    def _flush(self, loop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        items = [item for item, _ in batch]
+        try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="microbatch")
+            task = loop.run_in_executor(self._executor, self.batch_fn, items)
+        except Exception as e:
+            # Runs from a timer callback: nobody else would see this error
+            self._fail(batch, e)
+            return
+        task.add_done_callback(lambda t: self._deliver(batch, t))
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    @staticmethod
+    def _deliver(batch, task):
+        if task.cancelled():
+            results = [asyncio.CancelledError()] * len(batch)
+        elif task.exception() is not None:
+            results = [task.exception()] * len(batch)
+        else:
+            results = task.result()
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # caller went away
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        self._fail(batch, RuntimeError("micro-batcher closed"))
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
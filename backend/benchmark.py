@@ -0,0 +1,322 @@
+"""Latency and throughput benchmarks for serving and training.
+
+    python benchmark.py run [--only api,preprocess,predict,train] [--output FILE] [--baseline FILE]
+    python benchmark.py compare BASELINE.json CURRENT.json [--threshold 0.1]
+
+Everything runs in-process: the API is driven through an ASGI transport,
+not over the network. Inputs come from a fixed seed, so two runs on the same
+machine see the same requests and matrices.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SECTIONS = ('api', 'preprocess', 'predict', 'train')
+BATCH_SIZES = (1, 8, 64, 512, 4096)
+CONCURRENCY = (1, 8, 32)
+
+
+def store_categories(preprocessor_path=os.path.join(BASE_DIR, 'preprocessor.joblib')):
+    """Store categories the fitted encoder knows, as strings like the API receives them."""
+    import joblib
+    from order_features import fitted_categories
+
+    columns, categories = fitted_categories(joblib.load(preprocessor_path))
+    values = categories[columns.index('store_primary_category')]
+    return [f"{v:g}" if isinstance(v, (float, np.floating)) else str(v)
+            for v in values if not (isinstance(v, (float, np.floating)) and np.isnan(v))]
+
+
+def make_orders(n, seed=0, categories=None):
+    """Deterministic synthetic orders in the API's request format.
+
+    Store categories are drawn from ``categories`` (default: the fitted
+    encoder's), so the one-hot path sees known stores, not only unknowns.
+    """
+    categories = categories or store_categories()
+    rng = np.random.default_rng(seed)
+    orders = []
+    for i in range(n):
+        items = int(rng.integers(1, 10))
+        low = int(rng.integers(100, 2000))
+        orders.append({
+            'market_id': float(rng.integers(1, 7)),
+            'store_primary_category': categories[int(rng.integers(len(categories)))],
+            'order_protocol': float(rng.integers(1, 8)),
+            'total_items': items,
+            'subtotal': low * items,
+            'num_distinct_items': int(rng.integers(1, items + 1)),
+            'min_item_price': low,
+            'max_item_price': low + int(rng.integers(0, 1500)),
+            'total_outstanding_orders': float(rng.integers(0, 200)),
+            'estimated_store_to_consumer_driving_duration': float(rng.integers(100, 1500)),
+            'created_at': f"2015-02-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00",
+        })
+    return orders
+
+
+def time_call(fn, repeats=50, min_seconds=0.2):
+    """Median wall time of ``fn()`` in ms over at least ``repeats`` calls."""
+    fn()  # warm-up
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < repeats or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1000)
+
+
+def percentiles(latencies_s):
+    ms = np.asarray(latencies_s) * 1000
+    return {f'p{p}_ms': round(float(np.percentile(ms, p)), 3) for p in (50, 95, 99)}
+
+
+def bench_api(orders, concurrency_levels=CONCURRENCY, requests_per_level=2000):
+    """Closed-loop load on /predict: ``c`` clients, each sending its next request
+    as soon as the previous one returns."""
+    # Measure the model path, not cache hits, unless the caller opted in
+    os.environ.setdefault('PORTER_CACHE_SIZE', '0')
+    # Keep the prediction log's writer thread out of the measurements too
+    os.environ.setdefault('PORTER_PREDICTION_LOG', '0')
+    import httpx
+    import main
+
+    async def run_level(http, concurrency):
+        latencies, errors = [], 0
+        next_index = iter(range(requests_per_level))
+
+        async def client():
+            nonlocal errors
+            for i in next_index:
+                started = time.perf_counter()
+                response = await http.post('/predict', json=orders[i % len(orders)])
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        return dict(percentiles(latencies), rps=round(len(latencies) / elapsed, 1), errors=errors)
+
+    async def run_levels():
+        results = {}
+        # One lifespan for all levels: shutdown closes the micro-batcher
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench') as http:
+                for order in orders[:50]:
+                    await http.post('/predict', json=order)  # warm-up
+                for concurrency in concurrency_levels:
+                    name = f'api.predict.c{concurrency}'
+                    results[name] = await run_level(http, concurrency)
+                    print(f"/predict concurrency {concurrency}: {results[name]}")
+        return results
+
+    results = asyncio.run(run_levels())
+    config = {
+        'inference_engine': main.INFERENCE_ENGINE,
+        'serving_mode': main.SERVING_MODE,
+        'microbatch': main.MICROBATCH_ENABLED,
+        'compiled_preprocessor': main.COMPILED_PREPROCESSOR,
+        'cache_size': main.CACHE_SIZE,
+    }
+    return results, config
+
+
+def order_columns(orders):
+    """Column dict as main.build_input_columns produces it, hour/dow included."""
+    columns = {k: [o[k] for o in orders] for k in orders[0] if k != 'created_at'}
+    columns['order_hour'] = [int(o['created_at'][11:13]) for o in orders]
+    columns['order_dayofweek'] = [i % 7 for i in range(len(orders))]
+    return columns
+
+
+def bench_preprocess(orders, batch_sizes=BATCH_SIZES):
+    import joblib
+    import pandas as pd
+    from fast_preprocess import CompiledPreprocessor
+    from order_features import conform_categoricals
+
+    preprocessor = joblib.load(os.path.join(BASE_DIR, 'preprocessor.joblib'))
+    compiled = CompiledPreprocessor(preprocessor)
+    results = {}
+    for n in batch_sizes:
+        columns = order_columns(orders[:n])
+        frame = pd.DataFrame(columns)
+        # Timed with the category conversion, as main.predict_rows runs it
+        for name, fn in (('sklearn', lambda: preprocessor.transform(conform_categoricals(frame, preprocessor))),
+                         ('compiled', lambda: compiled.transform(conform_categoricals(columns, compiled)))):
+            ms = time_call(fn, repeats=20 if n >= 512 else 100)
+            results[f'preprocess.{name}.b{n}'] = {'median_ms': round(ms, 4),
+                                                  'rows_per_s': round(n / ms * 1000, 1)}
+            print(f"preprocess {name} batch {n}: {ms:.3f} ms")
+    return results
+
+
+def bench_predict(orders, batch_sizes=BATCH_SIZES):
+    import joblib
+    from fast_preprocess import CompiledPreprocessor
+    from numpy_model import NumpyDenseModel
+    from order_features import conform_categoricals
+
+    compiled = CompiledPreprocessor(joblib.load(os.path.join(BASE_DIR, 'preprocessor.joblib')))
+    X = compiled.transform(conform_categoricals(order_columns(orders[:max(batch_sizes)]), compiled))
+    engines = {'numpy': NumpyDenseModel.load(os.path.join(BASE_DIR, 'model.npz'))}
+    try:
+        from tensorflow import keras
+        engines['keras'] = keras.models.load_model(os.path.join(BASE_DIR, 'model.keras'))
+    except ImportError:
+        print("TensorFlow not installed; skipping the Keras engine")
+
+    results = {}
+    for name, model in engines.items():
+        for n in batch_sizes:
+            batch = X[:n]
+            ms = time_call(lambda: model.predict(batch, batch_size=n, verbose=0),
+                           repeats=20 if name == 'keras' else 100)
+            results[f'predict.{name}.b{n}'] = {'median_ms': round(ms, 4),
+                                               'rows_per_s': round(n / ms * 1000, 1)}
+            print(f"predict {name} batch {n}: {ms:.3f} ms")
+    return results
+
+
+def bench_train(data_path, cache_dir=None, batch_size=128):
+    """Wall time of one training epoch on ``data_path`` (data preparation timed separately)."""
+    from train_model import prepare_data_cached, build_model
+
+    started = time.perf_counter()
+    arrays, _ = prepare_data_cached(data_path, cache_dir)
+    prepare_seconds = time.perf_counter() - started
+
+    model = build_model(arrays['X_train'].shape[1])
+    started = time.perf_counter()
+    model.fit(arrays['X_train'], arrays['y_train'], validation_split=0.2, epochs=1,
+              batch_size=batch_size, verbose=0)
+    epoch_seconds = time.perf_counter() - started
+    rows = len(arrays['X_train'])
+    result = {'prepare_seconds': round(prepare_seconds, 3), 'epoch_seconds': round(epoch_seconds, 3),
+              'rows': rows, 'rows_per_s': round(rows / epoch_seconds, 1)}
+    print(f"train: {result}")
+    return {'train.epoch': result}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run(args):
+    sections = args.only.split(',') if args.only else list(SECTIONS)
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        sys.exit(f"Unknown sections: {sorted(unknown)}")
+
+    orders = make_orders(max(BATCH_SIZES), seed=args.seed)
+    report = {'environment': environment(), 'config': {}, 'results': {}}
+    if 'api' in sections:
+        results, config = bench_api(orders, requests_per_level=args.requests)
+        report['results'].update(results)
+        report['config']['api'] = config
+    if 'preprocess' in sections:
+        report['results'].update(bench_preprocess(orders))
+    if 'predict' in sections:
+        report['results'].update(bench_predict(orders))
+    if 'train' in sections:
+        if os.path.exists(args.data):
+            report['results'].update(bench_train(args.data, args.feature_cache))
+        else:
+            print(f"Training data {args.data} not found; skipping the training benchmark")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 1 if compare(baseline, report, args.threshold) else 0
+    return 0
+
+
+def higher_is_better(metric):
+    return metric in ('rps', 'rows_per_s')
+
+
+def compare(baseline, current, threshold=0.1):
+    """Print metric changes and return the regressions beyond ``threshold``."""
+    regressions = []
+    print(f"{'benchmark':<28} {'metric':<16} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metrics in sorted(current['results'].items()):
+        base_metrics = baseline['results'].get(name)
+        if base_metrics is None:
+            continue
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if metric in ('errors', 'rows') or not base or not isinstance(value, (int, float)):
+                continue
+            change = (value - base) / base
+            worse = -change if higher_is_better(metric) else change
+            flag = ''
+            if worse > threshold:
+                flag = '  REGRESSION'
+                regressions.append((name, metric, base, value))
+            print(f"{name:<28} {metric:<16} {base:>12.4g} {value:>12.4g} {change:>+8.1%}{flag}")
+        if metrics.get('errors'):
+            regressions.append((name, 'errors', base_metrics.get('errors', 0), metrics['errors']))
+            print(f"{name:<28} errors: {metrics['errors']}  REGRESSION")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {threshold:.0%}")
+    else:
+        print(f"No regressions beyond {threshold:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serving and training benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the benchmarks and write a JSON report")
+    run_parser.add_argument('--only', help=f"Comma-separated subset of {','.join(SECTIONS)}")
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--baseline', help="Compare against this report and exit 1 on regressions")
+    run_parser.add_argument('--threshold', type=float, default=0.1,
+                            help="Relative slowdown that counts as a regression (default 0.1 = 10%%)")
+    run_parser.add_argument('--requests', type=int, default=2000, help="/predict requests per concurrency level")
+    run_parser.add_argument('--data', default='data_2.csv', help="CSV for the training epoch benchmark")
+    run_parser.add_argument('--feature-cache', metavar='DIR', help="Feature cache for the training benchmark")
+    run_parser.add_argument('--seed', type=int, default=0)
+
+    compare_parser = commands.add_parser('compare', help="Compare two reports")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        sys.exit(run(args))
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    sys.exit(1 if compare(baseline, current, args.threshold) else 0)
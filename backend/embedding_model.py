@@ -0,0 +1,113 @@
+import json
+import os
+
+import numpy as np
+
+from numpy_model import NumpyDenseModel, export_weights
+
+VOCABULARY_FILE = 'vocabulary.json'
+
+
+def build_vocabulary(preprocessor, embedding_dim):
+    """Vocabulary of a fitted ``--encoding embedding`` preprocessor.
+
+    All categoricals share one embedding table. Column ``i`` owns rows
+    ``offsets[i]`` to ``offsets[i] + len(categories[i])``, where the first
+    row is for unknown values (ordinal code -1) and row ``offsets[i] + 1 + k``
+    is for ``categories[i][k]``.
+    """
+    numeric_features = preprocessor.transformers_[0][2]
+    _, encoder, categorical_features = preprocessor.transformers_[1]
+    categories = [c.tolist() for c in encoder.categories_]
+    offsets = np.cumsum([0] + [len(c) + 1 for c in categories])
+    return {
+        'numeric_features': list(numeric_features),
+        'categorical_features': list(categorical_features),
+        'categories': categories,
+        'offsets': offsets[:-1].tolist(),
+        'table_size': int(offsets[-1]),
+        'embedding_dim': embedding_dim,
+    }
+
+
+def save_vocabulary(vocabulary, model_dir):
+    with open(os.path.join(model_dir, VOCABULARY_FILE), 'w') as f:
+        json.dump(vocabulary, f, indent=2)
+
+
+def load_vocabulary(model_dir):
+    """The saved vocabulary, or None for a one-hot model."""
+    path = os.path.join(model_dir, VOCABULARY_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def split_inputs(X, vocabulary):
+    """Split a transformed [scaled numerics | ordinal codes] matrix into the two model inputs."""
+    n_numeric = len(vocabulary['numeric_features'])
+    numeric = np.asarray(X[:, :n_numeric], dtype=np.float32)
+    codes = np.asarray(X[:, n_numeric:], dtype=np.int32)
+    return numeric, codes + 1 + np.asarray(vocabulary['offsets'], dtype=np.int32)
+
+
+def build_embedding_model(vocabulary, units=(128, 64, 32), dropout=(0.2, 0.1, 0.0)):
+    """Two-input regression network: scaled numerics plus embedded categoricals."""
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    numeric = layers.Input(shape=(len(vocabulary['numeric_features']),), name='numeric')
+    categorical = layers.Input(shape=(len(vocabulary['categorical_features']),), dtype='int32',
+                               name='categorical')
+    embedded = layers.Embedding(vocabulary['table_size'], vocabulary['embedding_dim'],
+                                name='category_embedding')(categorical)
+    x = layers.Concatenate()([numeric, layers.Flatten()(embedded)])
+    for width, rate in zip(units, dropout):
+        x = layers.Dense(width, activation='relu')(x)
+        if rate:
+            x = layers.Dropout(rate)(x)
+    output = layers.Dense(1, activation='linear')(x)
+
+    model = keras.Model(inputs=[numeric, categorical], outputs=output)
+    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+    return model
+
+
+def export_embedding_weights(model, path):
+    """``export_weights`` for the two-input model, plus the embedding table."""
+    table = model.get_layer('category_embedding').get_weights()[0].astype(np.float32)
+    export_weights(model, path, skip=('category_embedding',), extra={'embedding': table})
+
+
+class KerasEmbeddingModel:
+    """Adapts the two-input Keras model to the single-matrix ``predict`` the API uses."""
+
+    def __init__(self, model, vocabulary):
+        self.model = model
+        self.vocabulary = vocabulary
+
+    def predict(self, X, batch_size=None, verbose=0):
+        return self.model.predict(list(split_inputs(X, self.vocabulary)), batch_size=batch_size,
+                                  verbose=verbose)
+
+
+class NumpyEmbeddingModel:
+    """NumPy forward pass for the two-input model: table lookup, then the Dense stack."""
+
+    def __init__(self, table, dense, vocabulary):
+        self.table = np.asarray(table, dtype=np.float32)
+        self.dense = dense
+        self.vocabulary = vocabulary
+        self.precision = dense.precision
+
+    @classmethod
+    def load(cls, path, vocabulary):
+        with np.load(path) as f:
+            table = f['embedding']
+        return cls(table, NumpyDenseModel.load(path), vocabulary)
+
+    def predict(self, X, batch_size=None, verbose=0):
+        numeric, index = split_inputs(X, self.vocabulary)
+        embedded = self.table[index].reshape(len(index), -1)
+        return self.dense.predict(np.concatenate([numeric, embedded], axis=1))
@@ -0,0 +1,65 @@
+"""Compare one-hot and embedding categorical encoding on the same data.
+
+    python encoding_report.py --data data_2.csv [--epochs 20] [--output encoding_report.json]
+
+Each encoding is trained by ``train_model.py`` in its own process, so the
+peak RSS it reports belongs to that run alone. Models are written to a
+temporary directory and discarded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENCODINGS = ('onehot', 'embedding')
+COLUMNS = (('test_mae', 'test MAE (min)', '{:.3f}'), ('peak_rss_mb', 'peak RSS (MB)', '{:.1f}'),
+           ('train_seconds', 'train (s)', '{:.1f}'), ('x_train_mb', 'X_train (MB)', '{:.2f}'),
+           ('n_features', 'features', '{}'), ('first_dense_params', 'first Dense params', '{}'),
+           ('params', 'params', '{}'), ('model_npz_bytes', 'model.npz (bytes)', '{}'),
+           ('model_keras_bytes', 'model.keras (bytes)', '{}'))
+
+
+def run(data_path, epochs=20, batch_size=128, embedding_dim=8):
+    reports = {}
+    with tempfile.TemporaryDirectory(prefix='encoding-report-') as tmp:
+        for encoding in ENCODINGS:
+            out_dir = os.path.join(tmp, encoding)
+            report_path = os.path.join(tmp, f'{encoding}.json')
+            print(f"Training with --encoding {encoding}...")
+            subprocess.run([sys.executable, os.path.join(BASE_DIR, 'train_model.py'), '--data', data_path,
+                            '--epochs', str(epochs), '--batch-size', str(batch_size), '--out-dir', out_dir,
+                            '--encoding', encoding, '--embedding-dim', str(embedding_dim),
+                            '--report-json', report_path],
+                           check=True, stdout=subprocess.DEVNULL)
+            with open(report_path) as f:
+                reports[encoding] = json.load(f)
+    return {'data': os.path.abspath(data_path), 'epochs': epochs, 'embedding_dim': embedding_dim,
+            'results': reports}
+
+
+def print_table(report):
+    results = report['results']
+    print(f"{'':<22}" + ''.join(f"{e:>14}" for e in ENCODINGS) + f"{'ratio':>10}")
+    for key, label, fmt in COLUMNS:
+        values = [results[e][key] for e in ENCODINGS]
+        ratio = f"{values[1] / values[0]:.2f}x" if values[0] else '-'
+        print(f"{label:<22}" + ''.join(f"{fmt.format(v):>14}" for v in values) + f"{ratio:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak training RSS, model size and MAE: one-hot vs embedding")
+    parser.add_argument('--data', default='data_2.csv')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--embedding-dim', type=int, default=8)
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, 'encoding_report.json'))
+    args = parser.parse_args()
+
+    report = run(args.data, args.epochs, args.batch_size, args.embedding_dim)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table(report)
+    print(f"Report written to {args.output}")
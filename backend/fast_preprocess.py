@@ -0,0 +1,210 @@
+import math
+import numpy as np
+
+
+class CompiledPreprocessor:
+    """Pandas-free replacement for the fitted ColumnTransformer.
+
+    Built once from the ``preprocessor.joblib`` produced by ``train_model.py``
+    (a StandardScaler over the numeric columns followed by a dense
+    OneHotEncoder, or an OrdinalEncoder in ``--encoding embedding`` mode,
+    over the categoricals). Scaling uses the fitted means and scales as
+    float64 arrays and the same in-place subtract/divide as StandardScaler,
+    and each categorical value is mapped to its output column (one-hot) or
+    code (ordinal, -1 when unknown) through a precomputed dict, so the
+    result is bit-for-bit equal to ``preprocessor.transform`` (or to its
+    cast when ``dtype`` is float32).
+    """
+
+    def __init__(self, preprocessor, dtype=np.float32):
+        from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder
+
+        numeric_features, categorical_features = [], []
+        mean = scale = categories = None
+        encoding = 'onehot'
+        for name, transformer, columns in preprocessor.transformers_:
+            if name == 'remainder':
+                if transformer != 'drop':
+                    raise ValueError("Only remainder='drop' is supported")
+                continue
+            if isinstance(transformer, StandardScaler) and not numeric_features:
+                if categorical_features:
+                    raise ValueError("The StandardScaler block must precede the OneHotEncoder block")
+                numeric_features = list(columns)
+                mean = transformer.mean_ if transformer.with_mean else None
+                scale = transformer.scale_ if transformer.with_std else None
+            elif isinstance(transformer, OneHotEncoder) and not categorical_features:
+                if transformer.drop is not None or getattr(transformer, '_infrequent_enabled', False):
+                    raise ValueError("OneHotEncoder with drop or infrequent categories is not supported")
+                if transformer.handle_unknown != 'ignore':
+                    raise ValueError("Only handle_unknown='ignore' is supported")
+                categorical_features = list(columns)
+                categories = [c.tolist() for c in transformer.categories_]
+            elif isinstance(transformer, OrdinalEncoder) and not categorical_features:
+                if (transformer.handle_unknown != 'use_encoded_value' or transformer.unknown_value != -1
+                        or transformer.encoded_missing_value != -1
+                        or getattr(transformer, '_infrequent_enabled', False)):
+                    raise ValueError("OrdinalEncoder must map unknown and missing values to -1")
+                categorical_features = list(columns)
+                categories = [c.tolist() for c in transformer.categories_]
+                encoding = 'ordinal'
+            else:
+                raise ValueError(f"Unsupported transformer: {transformer!r}")
+
+        self._setup(numeric_features, mean, scale, categorical_features, categories or [], dtype, encoding)
+
+    @classmethod
+    def from_params(cls, numeric_features, mean, scale, categorical_features, categories, dtype=np.float32,
+                    encoding='onehot'):
+        """Rebuild from saved parameters (see ``params``) without sklearn objects."""
+        self = cls.__new__(cls)
+        self._setup(numeric_features, mean, scale, categorical_features, categories, dtype, encoding)
+        return self
+
+    def params(self):
+        return {
+            'numeric_features': self.numeric_features,
+            'mean': self.mean,
+            'scale': self.scale,
+            'categorical_features': self.categorical_features,
+            'categories': self.categories,
+            'encoding': self.encoding,
+        }
+
+    def _setup(self, numeric_features, mean, scale, categorical_features, categories, dtype,
+               encoding='onehot'):
+        if encoding not in ('onehot', 'ordinal'):
+            raise ValueError(f"Unknown encoding {encoding!r}")
+        self.dtype = np.dtype(dtype)
+        self.encoding = encoding
+        self.numeric_features = list(numeric_features)
+        self.categorical_features = list(categorical_features)
+        self.mean = mean
+        self.scale = scale
+        self.categories = categories
+        self.category_index = []  # one {value: output column} dict per categorical
+        self.nan_index = []       # output column for a NaN category, if fitted
+
+        offset = len(self.numeric_features)
+        self._num_slice = slice(0, offset)
+        if encoding == 'ordinal':
+            # One column per categorical holding the category's code; unknown
+            # and missing values (NaN is never looked up) map to -1
+            for values in categories:
+                self.category_index.append({v: j for j, v in enumerate(values)
+                                            if not (isinstance(v, float) and math.isnan(v))})
+                self.nan_index.append(None)
+            self._cat_slice = slice(offset, offset + len(categories))
+            self.n_features_out = self._cat_slice.stop
+            return
+        for values in categories:
+            lookup, nan_col = {}, None
+            for j, value in enumerate(values):
+                if isinstance(value, float) and math.isnan(value):
+                    nan_col = offset + j
+                else:
+                    lookup[value] = offset + j
+            self.category_index.append(lookup)
+            self.nan_index.append(nan_col)
+            offset += len(values)
+        self._cat_slice = slice(self._num_slice.stop, offset)
+        self.n_features_out = offset
+
+    def transform(self, columns, out=None):
+        """Transform a mapping of column name -> values (lists, arrays or a DataFrame).
+
+        Writes into ``out`` when given (shape ``(n_rows, n_features_out)``),
+        otherwise allocates a new buffer.
+        """
+        n = len(columns[self.numeric_features[0] if self.numeric_features else self.categorical_features[0]])
+        if out is None:
+            out = np.empty((n, self.n_features_out), dtype=self.dtype)
+        elif out.shape != (n, self.n_features_out):
+            raise ValueError(f"out has shape {out.shape}, expected {(n, self.n_features_out)}")
+
+        if self.numeric_features:
+            numeric = np.empty((n, len(self.numeric_features)), dtype=np.float64)
+            for j, name in enumerate(self.numeric_features):
+                numeric[:, j] = columns[name]
+            if self.mean is not None:
+                numeric -= self.mean
+            if self.scale is not None:
+                numeric /= self.scale
+            out[:, self._num_slice] = numeric
+
+        if self.encoding == 'ordinal':
+            for j, (name, lookup) in enumerate(zip(self.categorical_features, self.category_index)):
+                out[:, self._cat_slice.start + j] = [lookup.get(v, -1) for v in _as_list(columns[name])]
+            return out
+
+        if self.categorical_features:
+            out[:, self._cat_slice] = 0
+        for name, lookup, nan_col in zip(self.categorical_features, self.category_index, self.nan_index):
+            for i, value in enumerate(_as_list(columns[name])):
+                col = lookup.get(value)
+                if col is None and nan_col is not None and _is_nan(value):
+                    col = nan_col
+                if col is not None:
+                    out[i, col] = 1.0
+
+        return out
+
+
+def _as_list(values):
+    return values.tolist() if hasattr(values, 'tolist') else values
+
+
+def _is_nan(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def check_parity(preprocessor, compiled, df):
+    """True if ``compiled`` reproduces ``preprocessor.transform(df)`` bit for bit."""
+    expected = preprocessor.transform(df).astype(compiled.dtype)
+    actual = compiled.transform(df)
+    return expected.shape == actual.shape and np.array_equal(
+        expected.view(np.uint8), actual.view(np.uint8))
+
+
+if __name__ == "__main__":
+    # Parity check against sklearn: python fast_preprocess.py [data.csv]
+    import os
+    import sys
+    import joblib
+    import pandas as pd
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    preprocessor = joblib.load(os.path.join(base_dir, 'preprocessor.joblib'))
+    numeric = list(preprocessor.transformers_[0][2])
+    categorical = list(preprocessor.transformers_[1][2])
+    categories = preprocessor.transformers_[1][1].categories_
+
+    if len(sys.argv) > 1:
+        df = pd.read_csv(sys.argv[1], nrows=50000)
+        df.columns = df.columns.str.strip()
+        created_at = pd.to_datetime(df['created_at'], errors='coerce')
+        df['order_hour'] = created_at.dt.hour
+        df['order_dayofweek'] = created_at.dt.dayofweek
+        df = df.dropna(subset=numeric + categorical)
+        df = df[numeric + categorical]
+    else:
+        # Random rows covering every fitted category plus unseen values
+        rng = np.random.default_rng(0)
+        n = 20000
+        df = pd.DataFrame({name: rng.normal(0, 1000, n) for name in numeric})
+        for name, cats in zip(categorical, categories):
+            values = list(cats) + [cats[0] + 1000 if cats.dtype.kind in 'if' else 'unseen']
+            df[name] = rng.choice(np.array(values, dtype=cats.dtype), n)
+
+    # The API receives store_primary_category as a string
+    df_api = df.copy()
+    df_api['store_primary_category'] = df_api['store_primary_category'].astype(str).astype(object)
+
+    ok = True
+    for label, frame in (('data', df), ('api', df_api)):
+        for dtype in (np.float64, np.float32):
+            compiled = CompiledPreprocessor(preprocessor, dtype=dtype)
+            parity = check_parity(preprocessor, compiled, frame)
+            print(f"{label} {np.dtype(dtype).name}: {len(frame)} rows, parity={'OK' if parity else 'MISMATCH'}")
+            ok = ok and parity
+    sys.exit(0 if ok else 1)
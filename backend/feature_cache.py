@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import joblib
+import numpy as np
+
+CACHE_FORMAT_VERSION = 1
+ARRAYS = ('X_train', 'X_test', 'y_train', 'y_test')
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(data_path, params):
+    """Hash of the input file contents and every preprocessing parameter."""
+    payload = json.dumps({'format': CACHE_FORMAT_VERSION,
+                          'data': file_digest(data_path),
+                          'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def load(cache_dir, key):
+    """Memory-map a cached entry; returns None on a miss.
+
+    Returns ``(arrays, preprocessor)`` where ``arrays`` maps X_train, X_test,
+    y_train and y_test to read-only ``np.memmap`` views of the ``.npy`` files.
+    """
+    entry = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(entry, 'meta.json')):
+        return None
+    arrays = {name: np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+    preprocessor = joblib.load(os.path.join(entry, 'preprocessor.joblib'))
+    return arrays, preprocessor
+
+
+def save(cache_dir, key, arrays, preprocessor, meta=None):
+    """Write an entry atomically: staged in a temp dir, then renamed into place."""
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir)
+    try:
+        for name in ARRAYS:
+            np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(arrays[name]))
+        joblib.dump(preprocessor, os.path.join(staging, 'preprocessor.joblib'))
+        # meta.json is written last and marks the entry as complete
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump(dict(meta or {}, shapes={n: list(arrays[n].shape) for n in ARRAYS}), f, indent=2)
+        os.replace(staging, os.path.join(cache_dir, key))
+    except OSError:
+        # Another run populated the same key first; keep theirs
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.exists(os.path.join(cache_dir, key, 'meta.json')):
+            raise
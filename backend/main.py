@@ -1,14 +1,59 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, ConfigDict, ValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Any, List, Optional, Union
+import hmac
+import math
+import threading
 import pandas as pd
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
 import joblib
-from datetime import datetime
+from datetime import datetime, timezone
 from fastapi.middleware.cors import CORSMiddleware
+from batching import MicroBatcher
+from order_features import parse_created_at, conform_categoricals
+from fast_preprocess import CompiledPreprocessor
+from numpy_model import NumpyDenseModel, PRECISIONS, variant_path
+from runtime_stats import rss_mb
+from serving_artifacts import load_artifacts, fingerprint
+from embedding_model import VOCABULARY_FILE, load_vocabulary, KerasEmbeddingModel, NumpyEmbeddingModel
+from prediction_cache import PredictionCache
+from prediction_log import PredictionLog, LOG_BUFFERED
+from market_state import MarketStateStore, MarketStateFeed, STATE_FIELDS, STATE_LOOKUPS
+from metrics import (registry, stage, MetricsMiddleware, SamplingProfiler, ERRORS, BATCH_SIZE,
+                     MODEL_LOAD_SECONDS, MODEL_LOADS, MODEL_INFO)
+
+@asynccontextmanager
+async def lifespan(app):
+    if SERVING_MODE == 'production':
+        # Load in the background so /health/ready can report "loading"
+        threading.Thread(target=load_initial_model, name="artifact-loader", daemon=True).start()
+    if RELOAD_WATCH:
+        threading.Thread(target=watch_model_files, name="model-watcher", daemon=True).start()
+    if market_state_feed is not None:
+        market_state_feed.start()
+    if prediction_log is not None:
+        try:
+            prediction_log.start()
+        except ImportError as e:
+            print(f"Prediction log disabled, pyarrow is required: {e}")
+            disable_prediction_log()
+    yield
+    stop_watching.set()
+    if batcher is not None:
+        batcher.close()
+    if market_state_feed is not None:
+        market_state_feed.close()
+    if prediction_log is not None:
+        prediction_log.close()
+        print(f"Prediction log: {prediction_log.stats()}")
 
-app = FastAPI(title="Porter Delivery Time Prediction API")
+app = FastAPI(title="Porter Delivery Time Prediction API", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -18,25 +63,123 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, endpoints=["/", "/predict", "/predict/batch", "/health/ready",
+                                                 "/cache/stats", "/metrics", "/admin/reload",
+                                                 "/admin/profile", "/market-state"])
 
 import os
 
 # Load artifacts
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, 'model.keras')
-PREPROCESSOR_PATH = os.path.join(BASE_DIR, 'preprocessor.joblib')
-
-try:
-    model = keras.models.load_model(MODEL_PATH)
-    preprocessor = joblib.load(PREPROCESSOR_PATH)
-    print(f"Model loaded from {MODEL_PATH}")
-    print(f"Preprocessor loaded from {PREPROCESSOR_PATH}")
-except Exception as e:
-    print(f"Error loading artifacts: {e}")
-    model = None
-    preprocessor = None
+
+# A model directory holds model.keras, model.npz, preprocessor.joblib and
+# artifacts/. PORTER_MODEL_DIR pins one; otherwise models/CURRENT (written by
+# retrain.py --promote) names a version under models/, else BASE_DIR is used.
+MODELS_DIR = os.environ.get('PORTER_MODELS_DIR', os.path.join(BASE_DIR, 'models'))
+CURRENT_POINTER = os.path.join(MODELS_DIR, 'CURRENT')
+
+# Upper bound on orders accepted by /predict/batch in one request
+MAX_BATCH_SIZE = int(os.environ.get('PORTER_MAX_BATCH_SIZE', '4096'))
+
+# Micro-batching of concurrent /predict calls
+MICROBATCH_ENABLED = os.environ.get('PORTER_MICROBATCH', '1') == '1'
+MICROBATCH_MAX_SIZE = int(os.environ.get('PORTER_MICROBATCH_MAX_SIZE', '64'))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('PORTER_MICROBATCH_MAX_WAIT_MS', '3'))
+
+# Use the pandas-free compiled transform instead of the sklearn ColumnTransformer
+COMPILED_PREPROCESSOR = os.environ.get('PORTER_COMPILED_PREPROCESSOR', '1') == '1'
+
+# 'keras' loads model.keras through TensorFlow, 'numpy' runs the exported model.npz
+INFERENCE_ENGINE = os.environ.get('PORTER_INFERENCE_ENGINE', 'keras')
+
+# Kernel precision of the served model: 'float16'/'int8' load the variants
+# written by quantize.py (model-<precision>.npz or artifacts-<precision>/) on
+# the NumPy engine
+MODEL_PRECISION = os.environ.get('PORTER_MODEL_PRECISION', 'float32')
+if MODEL_PRECISION not in PRECISIONS:
+    raise ValueError(f"PORTER_MODEL_PRECISION must be one of {PRECISIONS}, got {MODEL_PRECISION!r}")
+
+# 'production' memory-maps the exported artifacts/ directory (shared by all
+# workers through the page cache) and loads after startup; 'dev' loads at import
+SERVING_MODE = os.environ.get('PORTER_SERVING_MODE', 'dev')
+WORKERS = int(os.environ.get('PORTER_WORKERS', '1'))
+
+# In-process cache of predictions keyed on the engineered features (0 disables)
+CACHE_SIZE = int(os.environ.get('PORTER_CACHE_SIZE', '10000'))
+CACHE_TTL_SECONDS = float(os.environ.get('PORTER_CACHE_TTL_SECONDS', '0'))
+
+# Hot reload: POST /admin/reload (admin endpoints need PORTER_ADMIN_TOKEN) or a
+# watcher thread polling the model files every PORTER_RELOAD_POLL_SECONDS
+ADMIN_TOKEN = os.environ.get('PORTER_ADMIN_TOKEN')
+RELOAD_WATCH = os.environ.get('PORTER_RELOAD_WATCH', '0') == '1'
+RELOAD_POLL_SECONDS = float(os.environ.get('PORTER_RELOAD_POLL_SECONDS', '5'))
+
+# Sampling profiler: cProfile 1 in N /predict requests (0 = off); can be
+# changed at runtime through POST /admin/profile
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PORTER_PROFILE_SAMPLE_EVERY', '0'))
+PROFILE_DIR = os.environ.get('PORTER_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# Prediction log for monitoring and retraining: Parquet files under
+# PORTER_PREDICTION_LOG_DIR, written by a background thread
+PREDICTION_LOG = os.environ.get('PORTER_PREDICTION_LOG', '0') == '1'
+PREDICTION_LOG_DIR = os.environ.get('PORTER_PREDICTION_LOG_DIR', os.path.join(BASE_DIR, 'prediction_logs'))
+PREDICTION_LOG_BUFFER = int(os.environ.get('PORTER_PREDICTION_LOG_BUFFER', '100000'))
+PREDICTION_LOG_FLUSH_SECONDS = float(os.environ.get('PORTER_PREDICTION_LOG_FLUSH_SECONDS', '5'))
+PREDICTION_LOG_ROTATE_MB = float(os.environ.get('PORTER_PREDICTION_LOG_ROTATE_MB', '64'))
+PREDICTION_LOG_ROTATE_SECONDS = float(os.environ.get('PORTER_PREDICTION_LOG_ROTATE_SECONDS', '3600'))
+
+# Live market load (onshift, busy, outstanding) per market_id, fed by
+# POST /market-state and/or a JSON-lines file tailed by every worker; fills
+# those fields when a /predict payload leaves them out
+MARKET_STATE_WINDOW_SECONDS = float(os.environ.get('PORTER_MARKET_STATE_WINDOW_SECONDS', '300'))
+MARKET_STATE_BUCKETS = int(os.environ.get('PORTER_MARKET_STATE_BUCKETS', '30'))
+MARKET_STATE_MAX_MARKETS = int(os.environ.get('PORTER_MARKET_STATE_MAX_MARKETS', '10000'))
+MARKET_STATE_FILE = os.environ.get('PORTER_MARKET_STATE_FILE')
+MARKET_STATE_POLL_SECONDS = float(os.environ.get('PORTER_MARKET_STATE_POLL_SECONDS', '1'))
+MARKET_STATE_MAX_SKEW_SECONDS = float(os.environ.get('PORTER_MARKET_STATE_MAX_SKEW_SECONDS', '5'))
+
+class ServingBundle:
+    """One loaded model version. Each request handler reads the module-level
+    ``bundle`` once and passes that object to everything it calls, so a reload
+    swapping the reference never mixes a new preprocessor with an old model,
+    a version with another model's prediction, or drops in-flight requests."""
+
+    def __init__(self, model, preprocessor, compiled_preprocessor, version, model_dir):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.compiled_preprocessor = compiled_preprocessor
+        self.version = version
+        self.model_dir = model_dir
+        if compiled_preprocessor is not None:
+            features = compiled_preprocessor.numeric_features + compiled_preprocessor.categorical_features
+        else:
+            features = list(preprocessor.feature_names_in_)
+        # Live-load fields this model reads; only these must be known to predict
+        self.state_fields = [f for f in STATE_FIELDS if f in features]
+
+bundle = None
+reload_lock = threading.Lock()
+stop_watching = threading.Event()
+serving_state = {"status": "loading", "model_version": None, "load_seconds": None,
+                 "startup_seconds": None, "rss_mb": None, "error": None}
+prediction_cache = PredictionCache(CACHE_SIZE, CACHE_TTL_SECONDS) if CACHE_SIZE > 0 else None
+profiler = SamplingProfiler(PROFILE_SAMPLE_EVERY, PROFILE_DIR)
+market_state = MarketStateStore(MARKET_STATE_WINDOW_SECONDS, MARKET_STATE_BUCKETS, MARKET_STATE_MAX_MARKETS,
+                                MARKET_STATE_MAX_SKEW_SECONDS)
+market_state_feed = (MarketStateFeed(market_state, MARKET_STATE_FILE, MARKET_STATE_POLL_SECONDS)
+                     if MARKET_STATE_FILE else None)
+prediction_log = PredictionLog(PREDICTION_LOG_DIR, buffer_size=PREDICTION_LOG_BUFFER,
+                               flush_seconds=PREDICTION_LOG_FLUSH_SECONDS,
+                               rotate_bytes=int(PREDICTION_LOG_ROTATE_MB * (1 << 20)),
+                               rotate_seconds=PREDICTION_LOG_ROTATE_SECONDS) if PREDICTION_LOG else None
+
+def disable_prediction_log():
+    global prediction_log
+    prediction_log = None
 
 class OrderInput(BaseModel):
+    model_config = ConfigDict(allow_inf_nan=False)  # "inf"/"nan" are rejected, not predicted on
+
     market_id: float
     store_primary_category: str
     order_protocol: float
@@ -45,58 +188,517 @@ class OrderInput(BaseModel):
     num_distinct_items: int
     min_item_price: int
     max_item_price: int
-    total_outstanding_orders: float
+    total_outstanding_orders: Optional[float] = None  # filled from market state when left out
     estimated_store_to_consumer_driving_duration: float
     created_at: str  # ISO format string expected
+    total_onshift_partners: Optional[float] = None  # filled from market state when left out
+    total_busy_partners: Optional[float] = None  # filled from market state when left out
+
+class BatchOrderInput(BaseModel):
+    # Items are validated one by one so a bad order (even a non-object) only fails itself
+    orders: List[Any]
+
+def build_input_columns(orders, order_hour, order_dayofweek):
+    """Column-wise model inputs (name -> values) for a list of validated orders."""
+    return {
+        'market_id': [o.market_id for o in orders],
+        'store_primary_category': [o.store_primary_category for o in orders],
+        'order_protocol': [o.order_protocol for o in orders],
+        'total_items': [o.total_items for o in orders],
+        'subtotal': [o.subtotal for o in orders],
+        'num_distinct_items': [o.num_distinct_items for o in orders],
+        'min_item_price': [o.min_item_price for o in orders],
+        'max_item_price': [o.max_item_price for o in orders],
+        'total_outstanding_orders': [o.total_outstanding_orders for o in orders],
+        'estimated_store_to_consumer_driving_duration': [o.estimated_store_to_consumer_driving_duration for o in orders],
+        'total_onshift_partners': [o.total_onshift_partners for o in orders],
+        'total_busy_partners': [o.total_busy_partners for o in orders],
+        'order_hour': order_hour,
+        'order_dayofweek': order_dayofweek,
+    }
+
+def predict_rows(orders, order_hour, order_dayofweek, serving=None):
+    """Run one transform and one forward pass; returns minutes per order."""
+    serving = serving or bundle
+    BATCH_SIZE.observe(len(orders))
+    columns = build_input_columns(orders, order_hour, order_dayofweek)
+    if serving.compiled_preprocessor is not None:
+        with stage("transform"):
+            columns = conform_categoricals(columns, serving.compiled_preprocessor)
+            X_processed = serving.compiled_preprocessor.transform(columns)
+    else:
+        with stage("dataframe"):
+            frame = pd.DataFrame(columns)
+        with stage("transform"):
+            X_processed = serving.preprocessor.transform(conform_categoricals(frame, serving.preprocessor))
+    with stage("model_predict"):
+        prediction = serving.model.predict(X_processed, batch_size=len(orders), verbose=0)
+    return prediction[:, 0].astype(float)
+
+def feature_key(order, order_hour, order_dayofweek):
+    """Cache key: exactly the values the preprocessor sees for this order."""
+    return (order.market_id, order.store_primary_category, order.order_protocol,
+            order.total_items, order.subtotal, order.num_distinct_items,
+            order.min_item_price, order.max_item_price, order.total_outstanding_orders,
+            order.estimated_store_to_consumer_driving_duration,
+            order.total_onshift_partners, order.total_busy_partners,
+            int(order_hour), int(order_dayofweek))
+
+def enrich_order(order, serving=None):
+    """Fill live-load fields missing from ``order`` with its market's current state.
+
+    Raises ValueError if a field the served model needs is still unknown.
+    """
+    missing = [f for f in STATE_FIELDS if getattr(order, f) is None]
+    if not missing:
+        return
+    state = market_state.mean(order.market_id)
+    for field in missing:
+        value = state.get(field) if state is not None else None
+        if value is not None:
+            setattr(order, field, value)
+            STATE_LOOKUPS.inc("filled")
+    unknown = [f for f in (serving or bundle).state_fields if getattr(order, f) is None]
+    if unknown:
+        STATE_LOOKUPS.inc("missing", amount=len(unknown))
+        raise ValueError(f"{', '.join(unknown)} not given and no live state for market_id {order.market_id}")
+
+def log_predictions(orders, order_hour, order_dayofweek, predictions, version, latency_ms, endpoint):
+    """Queue one prediction log record per order; never blocks on disk."""
+    if prediction_log is None:
+        return
+    logged_at = datetime.now(timezone.utc)
+    rows = []
+    for order, hour, dayofweek, minutes in zip(orders, order_hour, order_dayofweek, predictions):
+        row = dict(order.__dict__)
+        row.update(order_hour=int(hour), order_dayofweek=int(dayofweek),
+                   predicted_delivery_time_minutes=float(minutes), model_version=version,
+                   latency_ms=latency_ms, endpoint=endpoint, logged_at=logged_at)
+        rows.append(row)
+    prediction_log.record(rows)
+
+def predict_microbatch(items):
+    # items are (order, hour, dayofweek, serving) tuples queued by concurrent /predict calls;
+    # each group of items is predicted with the bundle its request started with
+    results = [None] * len(items)
+    groups = {}
+    for i, item in enumerate(items):
+        groups.setdefault(id(item[3]), []).append(i)
+    for indices in groups.values():
+        serving = items[indices[0]][3]
+        try:
+            orders, hours, dayofweeks, _ = zip(*(items[i] for i in indices))
+            prediction = predict_rows(list(orders), list(hours), list(dayofweeks), serving)
+            for i, minutes in zip(indices, prediction):
+                results[i] = minutes
+            continue
+        except Exception:
+            pass
+        # Isolate the failing item(s) so one bad order does not fail its neighbours
+        for i in indices:
+            order, hour, dayofweek, _ = items[i]
+            try:
+                results[i] = predict_rows([order], [hour], [dayofweek], serving)[0]
+            except Exception as e:
+                results[i] = e
+    return results
+
+def resolve_model_dir():
+    if os.environ.get('PORTER_MODEL_DIR'):
+        return os.environ['PORTER_MODEL_DIR']
+    if os.path.exists(CURRENT_POINTER):
+        with open(CURRENT_POINTER) as f:
+            return os.path.join(MODELS_DIR, f.read().strip())
+    return BASE_DIR
+
+def model_files(model_dir):
+    """The files a load from ``model_dir`` reads in the current serving mode."""
+    if SERVING_MODE == 'production':
+        return [variant_path(os.path.join(model_dir, 'artifacts'), MODEL_PRECISION)]
+    if MODEL_PRECISION != 'float32':
+        model_file = variant_path('model.npz', MODEL_PRECISION)
+    else:
+        model_file = 'model.npz' if INFERENCE_ENGINE == 'numpy' else 'model.keras'
+    files = [os.path.join(model_dir, model_file), os.path.join(model_dir, 'preprocessor.joblib')]
+    if os.path.exists(os.path.join(model_dir, VOCABULARY_FILE)):
+        files.append(os.path.join(model_dir, VOCABULARY_FILE))
+    return files
+
+def load_bundle(model_dir):
+    files = model_files(model_dir)
+    if SERVING_MODE == 'production':
+        if os.path.exists(os.path.join(model_dir, VOCABULARY_FILE)):
+            raise ValueError(f"{model_dir} holds an embedding model, which has no artifacts/; "
+                             "serve it with PORTER_SERVING_MODE=dev")
+        model, compiled_preprocessor = load_artifacts(files[0])
+        print(f"Memory-mapped serving artifacts from {files[0]}")
+        return ServingBundle(model, None, compiled_preprocessor, fingerprint(files), model_dir)
+
+    model_path, preprocessor_path = files[:2]
+    vocabulary = load_vocabulary(model_dir)
+    if vocabulary is not None and MODEL_PRECISION != 'float32':
+        raise ValueError(f"{model_dir} holds an embedding model; only float32 is supported")
+    if model_path.endswith('.npz'):
+        if vocabulary is not None:
+            model = NumpyEmbeddingModel.load(model_path, vocabulary)
+        else:
+            model = NumpyDenseModel.load(model_path)
+        print(f"Model loaded from {model_path} (NumPy engine, {model.precision})")
+    else:
+        from tensorflow import keras
+        model = keras.models.load_model(model_path)
+        if vocabulary is not None:
+            model = KerasEmbeddingModel(model, vocabulary)
+        print(f"Model loaded from {model_path}")
+    preprocessor = joblib.load(preprocessor_path)
+    print(f"Preprocessor loaded from {preprocessor_path}")
+
+    compiled_preprocessor = None
+    if COMPILED_PREPROCESSOR:
+        try:
+            compiled_preprocessor = CompiledPreprocessor(preprocessor)
+            print("Using compiled preprocessor")
+        except ValueError as e:
+            print(f"Compiled preprocessor unavailable, using sklearn transform: {e}")
+    return ServingBundle(model, preprocessor, compiled_preprocessor, fingerprint(files), model_dir)
+
+def activate_model(model_dir):
+    """Load and warm up ``model_dir``, then swap it in. Raises on failure and
+    leaves the current model serving."""
+    global bundle
+    with reload_lock:
+        started = time.perf_counter()
+        try:
+            new_bundle = load_bundle(model_dir)
+            warmup(new_bundle)
+        except Exception:
+            MODEL_LOADS.inc("failure")
+            raise
+        previous = bundle
+        bundle = new_bundle
+        if prediction_cache is not None:
+            prediction_cache.set_version(new_bundle.version)
+
+        now = time.perf_counter()
+        serving_state.update(status="serving", model_version=new_bundle.version,
+                             load_seconds=round(now - started, 3), rss_mb=round(rss_mb(), 1),
+                             error=None)
+        MODEL_LOADS.inc("success")
+        MODEL_LOAD_SECONDS.set(value=now - started)
+        MODEL_INFO.clear()
+        MODEL_INFO.set(new_bundle.version, value=1)
+        if previous is not None:
+            print(f"Worker {os.getpid()} swapped model {previous.version} -> {new_bundle.version} "
+                  f"from {model_dir} in {now - started:.2f}s")
+        return new_bundle
+
+def load_initial_model():
+    try:
+        activate_model(resolve_model_dir())
+    except Exception as e:
+        print(f"Error loading artifacts: {e}")
+        serving_state.update(status="failed", error=str(e))
+        return
+
+    serving_state["startup_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+    print(f"Worker {os.getpid()} ready: startup {serving_state['startup_seconds']:.2f}s "
+          f"(artifacts + warmup {serving_state['load_seconds']:.2f}s), RSS {serving_state['rss_mb']:.1f} MB")
+
+def file_signature(paths):
+    signature = []
+    for path in paths:
+        names = sorted(os.listdir(path)) if os.path.isdir(path) else [None]
+        for name in names:
+            full = os.path.join(path, name) if name else path
+            st = os.stat(full)
+            signature.append((full, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+def watch_model_files():
+    """Reload when the model files (or the models/CURRENT pointer) change.
+
+    A change is only acted on once the signature is the same on two
+    consecutive polls, so a model that is still being written is not loaded.
+    """
+    loaded, pending = None, None
+    while not stop_watching.wait(RELOAD_POLL_SECONDS):
+        try:
+            model_dir = resolve_model_dir()
+            signature = file_signature(model_files(model_dir))
+        except OSError:
+            continue  # files are being replaced; try again next poll
+        if bundle is None:
+            continue
+        if loaded is None:
+            loaded = signature if model_dir == bundle.model_dir else ()
+        if signature == loaded:
+            pending = None
+        elif signature != pending:
+            pending = signature
+        else:
+            try:
+                activate_model(model_dir)
+                loaded = signature
+            except Exception as e:
+                print(f"Reload of {model_dir} failed, still serving {bundle.version}: {e}")
+                loaded = signature  # do not retry until the files change again
+            pending = None
+
+def warmup(serving):
+    """Run the batch shapes the API will see once so the first request is not slow."""
+    order = OrderInput(market_id=1.0, store_primary_category='warmup', order_protocol=1.0,
+                       total_items=1, subtotal=1000, num_distinct_items=1, min_item_price=1000,
+                       max_item_price=1000, total_outstanding_orders=0.0,
+                       estimated_store_to_consumer_driving_duration=600.0,
+                       created_at='2015-01-01T12:00:00')
+    for size in {1, MICROBATCH_MAX_SIZE}:
+        predict_rows([order] * size, [12] * size, [3] * size, serving)
+
+def ensure_ready():
+    if bundle is None:
+        if serving_state["status"] == "loading":
+            raise HTTPException(status_code=503, detail="Model loading")
+        raise HTTPException(status_code=500, detail="Model not loaded")
+
+if SERVING_MODE != 'production':
+    load_initial_model()
+
+batcher = None
+if MICROBATCH_ENABLED:
+    batcher = MicroBatcher(predict_microbatch,
+                           max_batch_size=MICROBATCH_MAX_SIZE,
+                           max_wait_ms=MICROBATCH_MAX_WAIT_MS)
 
 @app.get("/")
 def read_root():
     return {"message": "Porter Delivery Prediction API is running"}
 
+@app.get("/health/ready")
+def health_ready():
+    status_code = 200 if serving_state["status"] == "serving" else 503
+    return JSONResponse(status_code=status_code, content=dict(serving_state, pid=os.getpid()))
+
+@app.get("/cache/stats")
+def cache_stats():
+    if prediction_cache is None:
+        return {"enabled": False}
+    return dict(prediction_cache.stats(), enabled=True)
+
+@app.get("/metrics")
+def metrics():
+    if prediction_log is not None:
+        LOG_BUFFERED.set(value=prediction_log.stats()["buffered"])
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+def check_admin_token(x_admin_token):
+    # No token configured means admin endpoints are off, not open
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled: set PORTER_ADMIN_TOKEN")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def requested_model_dir(model_dir):
+    """Resolve a client-supplied model_dir; only directories under MODELS_DIR are loadable."""
+    root = os.path.realpath(MODELS_DIR)
+    path = os.path.realpath(os.path.join(root, model_dir))  # relative paths are relative to models/
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise HTTPException(status_code=400, detail=f"model_dir must be a directory under {MODELS_DIR}")
+    return path
+
+class ReloadRequest(BaseModel):
+    model_dir: Optional[str] = None  # under MODELS_DIR; defaults to the configured/CURRENT model dir
+
+@app.post("/admin/reload")
+def admin_reload(request: Optional[ReloadRequest] = None, x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    if request and request.model_dir:
+        model_dir = requested_model_dir(request.model_dir)
+    else:
+        model_dir = resolve_model_dir()
+    current = bundle.version if bundle is not None else None
+    try:
+        new_bundle = activate_model(model_dir)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Reload failed, still serving {current}: {e}")
+    return {"previous_version": current, "model_version": new_bundle.version, "model_dir": model_dir}
+
+class MarketStateEvent(BaseModel):
+    market_id: float
+    total_onshift_partners: Optional[float] = None
+    total_busy_partners: Optional[float] = None
+    total_outstanding_orders: Optional[float] = None
+    timestamp: Optional[Union[float, str]] = None  # epoch seconds or ISO 8601; defaults to now
+
+class MarketStateBatch(BaseModel):
+    events: List[MarketStateEvent]
+
+@app.post("/market-state")
+def ingest_market_state(batch: MarketStateBatch, x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    results = {"accepted": 0, "stale": 0, "invalid": 0}
+    for event in batch.events:
+        results[market_state.ingest(event.model_dump())] += 1
+    return results
+
+@app.get("/market-state")
+def get_market_state():
+    return dict(market_state.stats(), state={str(k): v for k, v in market_state.markets().items()})
+
+class ProfileRequest(BaseModel):
+    sample_every: int  # profile 1 in N /predict requests; 0 turns profiling off
+    dump_every: Optional[int] = None
+
+@app.post("/admin/profile")
+def admin_profile(request: ProfileRequest, x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    dumped = profiler.dump()  # keep what was collected before reconfiguring
+    profiler.configure(request.sample_every, request.dump_every)
+    return dict(profiler.status(), dumped=dumped)
+
 @app.post("/predict")
-def predict_delivery_time(order: OrderInput):
-    if model is None or preprocessor is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+async def predict_delivery_time(order: OrderInput):
+    ensure_ready()
+    started = time.perf_counter()
+    serving = bundle  # this request's model, whatever a reload does meanwhile
 
     try:
+        with stage("enrich"):
+            enrich_order(order, serving)
+
         # Parse timestamp
-        dt = pd.to_datetime(order.created_at)
-        order_hour = dt.hour
-        order_dayofweek = dt.dayofweek
-
-        # Create DataFrame for input
-        data = {
-            'market_id': [order.market_id],
-            'store_primary_category': [order.store_primary_category],
-            'order_protocol': [order.order_protocol],
-            'total_items': [order.total_items],
-            'subtotal': [order.subtotal],
-            'num_distinct_items': [order.num_distinct_items],
-            'min_item_price': [order.min_item_price],
-            'max_item_price': [order.max_item_price],
-            'total_outstanding_orders': [order.total_outstanding_orders],
-            'estimated_store_to_consumer_driving_duration': [order.estimated_store_to_consumer_driving_duration],
-            'order_hour': [order_hour],
-            'order_dayofweek': [order_dayofweek]
-        }
-        
-        df_input = pd.DataFrame(data)
+        with stage("parse_created_at"):
+            dt = pd.to_datetime(order.created_at)
+            order_hour = dt.hour
+            order_dayofweek = dt.dayofweek
+
+        with stage("build_columns"):
+            data = build_input_columns([order], [order_hour], [order_dayofweek])
 
-        # Preprocess
-        X_processed = preprocessor.transform(df_input)
+        with stage("cache_lookup"):
+            key = feature_key(order, order_hour, order_dayofweek)
+            version = serving.version
+            predicted_minutes = prediction_cache.get(key) if prediction_cache is not None else None
 
-        # Predict
-        prediction = model.predict(X_processed)
-        predicted_minutes = float(prediction[0][0])
+        # Preprocess and predict, coalesced with concurrent requests when enabled
+        if predicted_minutes is None:
+            with stage("inference"):
+                if profiler.should_sample():
+                    # Sampled requests run on their own so the profile covers only them
+                    prediction = await run_in_threadpool(profiler.run, predict_rows, [order],
+                                                         [order_hour], [order_dayofweek], serving)
+                    predicted_minutes = prediction[0]
+                elif batcher is not None:
+                    predicted_minutes = await batcher.submit((order, order_hour, order_dayofweek, serving))
+                else:
+                    prediction = await run_in_threadpool(predict_rows, [order], [order_hour], [order_dayofweek],
+                                                         serving)
+                    predicted_minutes = prediction[0]
+            if not math.isfinite(predicted_minutes):
+                raise ValueError("Model returned a non-finite prediction")
+            if prediction_cache is not None:
+                prediction_cache.put(key, predicted_minutes, version)
 
+        log_predictions([order], [order_hour], [order_dayofweek], [predicted_minutes], version,
+                        (time.perf_counter() - started) * 1000, "/predict")
         return {
-            "predicted_delivery_time_minutes": round(predicted_minutes, 2),
+            "predicted_delivery_time_minutes": round(float(predicted_minutes), 2),
             "input_summary": data
         }
 
     except Exception as e:
+        ERRORS.inc("/predict", type(e).__name__)
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/predict/batch")
+def predict_delivery_time_batch(batch: BatchOrderInput):
+    ensure_ready()
+    started = time.perf_counter()
+    if len(batch.orders) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} orders")
+    serving = bundle  # this request's model, whatever a reload does meanwhile
+
+    results = [None] * len(batch.orders)
+
+    # Validate each order on its own
+    valid_idx, valid_orders = [], []
+    for i, raw in enumerate(batch.orders):
+        try:
+            order = OrderInput.model_validate(raw)
+            with stage("enrich"):
+                enrich_order(order, serving)
+            valid_orders.append(order)
+            valid_idx.append(i)
+        except (ValidationError, TypeError) as e:
+            ERRORS.inc("/predict/batch", type(e).__name__)
+            results[i] = {"index": i, "error": str(e)}
+        except ValueError as e:
+            ERRORS.inc("/predict/batch", "MissingMarketState")
+            results[i] = {"index": i, "error": str(e)}
+
+    # Parse all timestamps at once and drop the ones that failed
+    with stage("parse_created_at"):
+        hours, dayofweeks, parse_errors = parse_created_at([o.created_at for o in valid_orders])
+    keep = []
+    for j, err in enumerate(parse_errors):
+        if err is None:
+            keep.append(j)
+        else:
+            ERRORS.inc("/predict/batch", "InvalidTimestamp")
+            results[valid_idx[j]] = {"index": valid_idx[j], "error": err}
+
+    # Answer what we can from the cache
+    version = serving.version
+    keys = {}
+    if prediction_cache is not None:
+        misses = []
+        for j in keep:
+            keys[j] = feature_key(valid_orders[j], hours[j], dayofweeks[j])
+            cached = prediction_cache.get(keys[j])
+            if cached is None:
+                misses.append(j)
+            else:
+                results[valid_idx[j]] = {
+                    "index": valid_idx[j],
+                    "predicted_delivery_time_minutes": round(float(cached), 2)
+                }
+        keep = misses
+
+    if keep:
+        try:
+            # One transform and one forward pass over the whole matrix
+            prediction = predict_rows([valid_orders[j] for j in keep], hours[keep], dayofweeks[keep], serving)
+        except Exception as e:
+            ERRORS.inc("/predict/batch", type(e).__name__)
+            raise HTTPException(status_code=400, detail=str(e))
+
+        for row, j in enumerate(keep):
+            i = valid_idx[j]
+            if not math.isfinite(prediction[row]):
+                ERRORS.inc("/predict/batch", "NonFinitePrediction")
+                results[i] = {"index": i, "error": "Model returned a non-finite prediction"}
+                continue
+            if prediction_cache is not None:
+                prediction_cache.put(keys[j], prediction[row], version)
+            results[i] = {
+                "index": i,
+                "predicted_delivery_time_minutes": round(float(prediction[row]), 2)
+            }
+
+    served = [j for j in range(len(valid_orders)) if "error" not in results[valid_idx[j]]]
+    log_predictions([valid_orders[j] for j in served], hours[served], dayofweeks[served],
+                    [results[valid_idx[j]]["predicted_delivery_time_minutes"] for j in served],
+                    version, (time.perf_counter() - started) * 1000, "/predict/batch")
+
+    n_errors = sum(1 for r in results if "error" in r)
+    return {
+        "predictions": results,
+        "count": len(results),
+        "errors": n_errors
+    }
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if WORKERS > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
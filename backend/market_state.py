@@ -0,0 +1,305 @@
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import registry
+
+# Live market load the model uses but a client usually cannot supply
+STATE_FIELDS = ('total_onshift_partners', 'total_busy_partners', 'total_outstanding_orders')
+
+STATE_EVENTS = registry.counter('porter_market_state_events_total',
+                                'Market state events by result (accepted, stale, invalid)', ('result',))
+STATE_MARKETS = registry.gauge('porter_market_state_markets', 'Markets with live state')
+STATE_LOOKUPS = registry.counter('porter_market_state_fills_total',
+                                 'Request fields filled from market state, by result (filled, missing)',
+                                 ('result',))
+
+
+class _Snapshot:
+    """What readers see for one market; replaced, never modified."""
+    __slots__ = ('values', 'updated_at')
+
+    def __init__(self, values, updated_at):
+        self.values = values
+        self.updated_at = updated_at
+
+
+class _Market:
+    """Ring of time buckets with per-field sums and counts, plus running totals."""
+
+    def __init__(self, n_buckets):
+        n_fields = len(STATE_FIELDS)
+        self.lock = threading.Lock()
+        self.bucket_ids = [None] * n_buckets
+        self.sums = [[0.0] * n_fields for _ in range(n_buckets)]
+        self.counts = [[0] * n_fields for _ in range(n_buckets)]
+        self.total_sums = [0.0] * n_fields
+        self.total_counts = [0] * n_fields
+        self.head = None  # newest bucket id seen
+        self.snapshot = None
+        self.removed = False  # set under ``lock`` once the store has dropped this market
+
+    def clear_slot(self, slot, bucket_id):
+        for f in range(len(STATE_FIELDS)):
+            self.total_sums[f] -= self.sums[slot][f]
+            self.total_counts[f] -= self.counts[slot][f]
+            self.sums[slot][f] = 0.0
+            self.counts[slot][f] = 0
+        self.bucket_ids[slot] = bucket_id
+
+
+class MarketStateStore:
+    """Rolling-window live load (onshift, busy, outstanding) per market_id.
+
+    Each market keeps ``n_buckets`` time buckets spanning ``window_seconds``
+    with running totals, so an event is folded in with O(1) work and
+    ``mean`` returns the per-field rolling mean over the window ending at
+    the market's newest event (not the latest value reported). Reads take
+    no lock: ``mean`` picks up the market's current snapshot, which writers
+    replace after each update under that market's own lock. Markets without
+    an event for ``window_seconds`` read as missing and are removed by
+    ``expire``. At most ``max_markets`` are kept; a new market beyond that
+    evicts the least recently updated one. A market is only removed while
+    holding its lock, and an update that finds its market removed starts
+    over on a fresh one, so no event is folded into a dropped market.
+    Events stamped up to ``max_skew_seconds`` in the future count as now;
+    later ones are invalid, since they would push the window past every
+    real-time event.
+    """
+
+    def __init__(self, window_seconds=300.0, n_buckets=30, max_markets=10000, max_skew_seconds=5.0):
+        self.window_seconds = window_seconds
+        self.max_skew_seconds = max_skew_seconds
+        self.n_buckets = n_buckets
+        self.bucket_seconds = window_seconds / n_buckets
+        self.max_markets = max_markets
+        self.accepted = 0
+        self.stale = 0
+        self.invalid = 0
+        self.evicted = 0
+        self.expired = 0
+        self._markets = {}
+        self._lock = threading.Lock()  # guards inserting and removing markets only
+        self._count_lock = threading.Lock()
+        self._last_expire = 0.0
+
+    def mean(self, market_id, now=None):
+        """Field -> rolling mean over the window, or None if the market has no live state."""
+        market = self._markets.get(_market_key(market_id))
+        snapshot = market.snapshot if market is not None else None
+        if snapshot is None or (now or time.time()) - snapshot.updated_at > self.window_seconds:
+            return None
+        return snapshot.values
+
+    def update(self, market_id, values, timestamp=None, now=None):
+        """Fold one observation in; returns 'accepted', 'stale' or 'invalid' (from the future)."""
+        now = now or time.time()
+        timestamp = now if timestamp is None else timestamp
+        if timestamp > now + self.max_skew_seconds:
+            return self._count('invalid')
+        timestamp = min(timestamp, now)
+        if now - timestamp > self.window_seconds:
+            return self._count('stale')
+        key = _market_key(market_id)
+        bucket_id = int(timestamp // self.bucket_seconds)
+        while True:
+            market = self._markets.get(key) or self._insert(key, now)
+            with market.lock:
+                if not market.removed:
+                    result = self._fold(market, bucket_id, timestamp, values)
+                    break
+            # Expired or evicted between the lookup and the lock: retry on a fresh market
+
+        if now - self._last_expire >= 1.0:
+            self.expire(now)
+        return self._count(result)
+
+    def _fold(self, market, bucket_id, timestamp, values):
+        """Add one observation to ``market`` (whose lock is held); returns the event result."""
+        if market.head is None:
+            market.head = bucket_id
+        elif bucket_id > market.head:
+            # Slide the window forward, dropping buckets that fell out of it
+            for b in range(max(market.head + 1, bucket_id - self.n_buckets + 1), bucket_id + 1):
+                market.clear_slot(b % self.n_buckets, b)
+            market.head = bucket_id
+        elif bucket_id <= market.head - self.n_buckets:
+            return 'stale'
+        slot = bucket_id % self.n_buckets
+        if market.bucket_ids[slot] != bucket_id:
+            market.clear_slot(slot, bucket_id)
+        for f, name in enumerate(STATE_FIELDS):
+            value = values.get(name)
+            if value is not None:
+                market.sums[slot][f] += value
+                market.counts[slot][f] += 1
+                market.total_sums[f] += value
+                market.total_counts[f] += 1
+        means = {name: (market.total_sums[f] / market.total_counts[f] if market.total_counts[f] else None)
+                 for f, name in enumerate(STATE_FIELDS)}
+        updated_at = max(timestamp, market.snapshot.updated_at) if market.snapshot else timestamp
+        market.snapshot = _Snapshot(means, updated_at)
+        return 'accepted'
+
+    def ingest(self, event, now=None):
+        """Validate one event dict (market_id, any STATE_FIELDS, optional timestamp) and apply it."""
+        try:
+            market_id = event['market_id']
+            values = {}
+            for name in STATE_FIELDS:
+                if event.get(name) is not None:
+                    values[name] = float(event[name])
+                    # One NaN or inf would poison the market's running totals for good
+                    if not math.isfinite(values[name]) or values[name] < 0:
+                        raise ValueError(f"{name} must be a finite number >= 0")
+            if market_id is None or not values:
+                raise ValueError("needs market_id and at least one of " + ", ".join(STATE_FIELDS))
+            timestamp = parse_timestamp(event.get('timestamp'))
+            if timestamp is not None and not math.isfinite(timestamp):
+                raise ValueError("timestamp must be finite")
+            if not math.isfinite(_market_key(market_id)):
+                raise ValueError("market_id must be finite")
+        except (KeyError, TypeError, ValueError):
+            return self._count('invalid')
+        return self.update(market_id, values, timestamp, now)
+
+    def expire(self, now=None):
+        """Drop markets with no event for ``window_seconds``; returns how many."""
+        with self._lock:
+            return self._expire_locked(now or time.time())
+
+    def markets(self, now=None):
+        now = now or time.time()
+        return {key: self.mean(key, now) for key in list(self._markets)}
+
+    def stats(self):
+        return {"markets": len(self._markets), "max_markets": self.max_markets,
+                "window_seconds": self.window_seconds, "buckets": self.n_buckets,
+                "accepted": self.accepted, "stale": self.stale, "invalid": self.invalid,
+                "evicted": self.evicted, "expired": self.expired}
+
+    def _insert(self, key, now):
+        with self._lock:
+            market = self._markets.get(key)
+            if market is not None:
+                return market
+            if len(self._markets) >= self.max_markets:
+                self._expire_locked(now)
+            if len(self._markets) >= self.max_markets:
+                oldest = min(self._markets, key=lambda k: self._markets[k].snapshot.updated_at
+                             if self._markets[k].snapshot else float('inf'))
+                self._remove_locked(oldest)
+                self.evicted += 1
+            market = self._markets[key] = _Market(self.n_buckets)
+            STATE_MARKETS.set(value=len(self._markets))
+            return market
+
+    def _expire_locked(self, now):
+        self._last_expire = now
+        cutoff = now - self.window_seconds
+        # A market without a snapshot was just inserted and is about to get one
+        stale = [k for k, m in self._markets.items() if m.snapshot is not None and m.snapshot.updated_at < cutoff]
+        expired = 0
+        for key in stale:
+            # An update may have refreshed it since the scan; check again under its lock
+            expired += self._remove_locked(key, lambda m: m.snapshot.updated_at < cutoff)
+        self.expired += expired
+        STATE_MARKETS.set(value=len(self._markets))
+        return expired
+
+    def _remove_locked(self, key, check=None):
+        """Drop market ``key`` (``self._lock`` held) unless ``check(market)`` fails; returns 1 or 0."""
+        market = self._markets[key]
+        with market.lock:
+            if check is not None and not check(market):
+                return 0
+            market.removed = True
+            del self._markets[key]
+        return 1
+
+    def _count(self, result):
+        with self._count_lock:
+            if result == 'accepted':
+                self.accepted += 1
+            elif result == 'stale':
+                self.stale += 1
+            else:
+                self.invalid += 1
+        STATE_EVENTS.inc(result)
+        return result
+
+
+def _market_key(market_id):
+    return float(market_id)
+
+
+def parse_timestamp(value):
+    """Epoch seconds from a number or an ISO 8601 string (naive = UTC); None stays None."""
+    if value is None or isinstance(value, (int, float)):
+        return None if value is None else float(value)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class MarketStateFeed:
+    """Tails a JSON-lines event file into a MarketStateStore.
+
+    The file is read from the start (events older than the window are
+    skipped cheaply) and then polled every ``poll_seconds`` for appended
+    lines. A partial last line waits for the next poll. If the file shrinks
+    or is replaced, it is read again from the start.
+    """
+
+    def __init__(self, store, path, poll_seconds=1.0):
+        self.store = store
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.lines = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="market-state-feed", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        offset, inode, pending = 0, None, b''
+        while not self._stop.is_set():
+            try:
+                stat = os.stat(self.path)
+                if stat.st_ino != inode or stat.st_size < offset:
+                    offset, inode, pending = 0, stat.st_ino, b''
+                if stat.st_size > offset:
+                    with open(self.path, 'rb') as f:
+                        f.seek(offset)
+                        data = pending + f.read(stat.st_size - offset)
+                    offset = stat.st_size
+                    *lines, pending = data.split(b'\n')
+                    for line in lines:
+                        if line.strip():
+                            self._apply(line)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Market state feed: cannot read {self.path}: {e}")
+            self._stop.wait(self.poll_seconds)
+
+    def _apply(self, line):
+        self.lines += 1
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        # Anything but a JSON object is counted as an invalid event
+        self.store.ingest(event if isinstance(event, dict) else {})
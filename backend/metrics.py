@@ -0,0 +1,264 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for stage and request latency histograms
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f'{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}'
+                                 for k, v in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            # Non-cumulative per-bucket counts; cumulated when rendering
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket'
+                             f'{_format_labels(self.label_names + ("le",), labels + (le,))} {cumulative}')
+            suffix = _format_labels(self.label_names, labels)
+            lines.append(f'{self.name}_sum{suffix} {total!r}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return lines
+
+
+class Registry:
+    """Process-local metrics rendered in the Prometheus text exposition format.
+
+    With several uvicorn workers each process keeps its own values; scrape
+    them per worker or aggregate in Prometheus.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+REQUESTS = registry.counter('porter_requests_total', 'HTTP requests by endpoint and status code',
+                            ('endpoint', 'status'))
+REQUEST_SECONDS = registry.histogram('porter_request_duration_seconds', 'End-to-end request latency',
+                                     ('endpoint',))
+ERRORS = registry.counter('porter_errors_total', 'Failed requests by endpoint and error type',
+                          ('endpoint', 'type'))
+STAGE_SECONDS = registry.histogram('porter_stage_duration_seconds',
+                                   'Time spent in each stage of the prediction path', ('stage',))
+BATCH_SIZE = registry.histogram('porter_inference_batch_size', 'Rows per transform/predict call',
+                                buckets=BATCH_SIZE_BUCKETS)
+MODEL_LOAD_SECONDS = registry.gauge('porter_model_load_seconds',
+                                    'Duration of the last successful model load including warmup')
+MODEL_LOADS = registry.counter('porter_model_loads_total', 'Model load attempts by result', ('result',))
+MODEL_INFO = registry.gauge('porter_model_info', 'Currently served model version', ('version',))
+
+
+@contextmanager
+def stage(name):
+    """Record the duration of the enclosed block under ``stage=name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, name)
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per endpoint.
+
+    Paths outside ``endpoints`` are reported as ``other`` so unknown URLs
+    cannot blow up label cardinality.
+    """
+
+    def __init__(self, app, endpoints=()):
+        self.app = app
+        self.endpoints = set(endpoints)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        endpoint = scope['path'] if scope['path'] in self.endpoints else 'other'
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint)
+            REQUESTS.inc(endpoint, str(status))
+            if status == 422:
+                ERRORS.inc(endpoint, 'RequestValidationError')
+
+
+class SamplingProfiler:
+    """cProfile 1 in ``sample_every`` calls and accumulate the stats.
+
+    Disabled (``sample_every`` 0) the cost per call is one integer check.
+    Only one call is profiled at a time; samples that would overlap are
+    skipped. The accumulated stats are dumped to ``out_dir`` every
+    ``dump_every`` samples and can be read with ``python -m pstats``.
+    """
+
+    def __init__(self, sample_every=0, out_dir='profiles', dump_every=10):
+        self.sample_every = sample_every
+        self.out_dir = out_dir
+        self.dump_every = dump_every
+        self.samples = 0
+        self._calls = 0
+        self._stats = None
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+
+    def configure(self, sample_every, dump_every=None):
+        with self._lock:
+            self.sample_every = max(0, int(sample_every))
+            if dump_every:
+                self.dump_every = int(dump_every)
+            self._calls = 0
+            if not self.sample_every:
+                self._stats = None
+
+    def should_sample(self):
+        if not self.sample_every:
+            return False
+        with self._lock:
+            self._calls += 1
+            return self._calls % self.sample_every == 0
+
+    def run(self, fn, *args):
+        """Call ``fn(*args)`` under cProfile unless another sample is in progress."""
+        if not self._active.acquire(blocking=False):
+            return fn(*args)
+        try:
+            profile = cProfile.Profile()
+            try:
+                result = profile.runcall(fn, *args)
+            finally:
+                self._record(profile)
+            return result
+        finally:
+            self._active.release()
+
+    def _record(self, profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.samples += 1
+            if self.samples % self.dump_every == 0:
+                self._dump()
+
+    def _dump(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f'predict-{os.getpid()}.prof')
+        self._stats.dump_stats(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return path
+
+    def dump(self):
+        with self._lock:
+            return self._dump() if self._stats is not None else None
+
+    def status(self):
+        with self._lock:
+            return {"sample_every": self.sample_every, "dump_every": self.dump_every,
+                    "samples": self.samples, "out_dir": os.path.abspath(self.out_dir)}
@@ -0,0 +1,304 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+import feature_cache
+
+# Candidate grid: layer widths and batch sizes around the production model,
+# the EDA notebook's early-stopping variant and its RandomForest baseline
+DEFAULT_CANDIDATES = [
+    {'name': 'nn-128-64-32-b128', 'kind': 'nn', 'units': [128, 64, 32], 'dropout': [0.2, 0.1, 0.0],
+     'batch_size': 128, 'epochs': 20},
+    {'name': 'nn-128-64-32-b512', 'kind': 'nn', 'units': [128, 64, 32], 'dropout': [0.2, 0.1, 0.0],
+     'batch_size': 512, 'epochs': 20},
+    {'name': 'nn-64-32-b128', 'kind': 'nn', 'units': [64, 32], 'dropout': [0.1, 0.0],
+     'batch_size': 128, 'epochs': 20},
+    {'name': 'nn-256-128-64-b256', 'kind': 'nn', 'units': [256, 128, 64], 'dropout': [0.2, 0.1, 0.0],
+     'batch_size': 256, 'epochs': 20},
+    {'name': 'nn-128-64-32-earlystop', 'kind': 'nn', 'units': [128, 64, 32], 'dropout': [0.2, 0.1, 0.0],
+     'batch_size': 512, 'epochs': 50, 'early_stopping': True},
+    {'name': 'rf-100', 'kind': 'rf', 'n_estimators': 100},
+]
+
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS')
+
+
+def thread_env(threads):
+    """Environment that caps BLAS/OpenMP/TensorFlow threads in a process started with it."""
+    env = {var: str(threads) for var in THREAD_ENV_VARS}
+    env['TF_NUM_INTEROP_THREADS'] = '1'
+    env['TF_CPP_MIN_LOG_LEVEL'] = os.environ.get('TF_CPP_MIN_LOG_LEVEL', '2')
+    return env
+
+
+@contextmanager
+def worker_threads(threads):
+    """Apply ``thread_env(threads)`` to worker processes spawned inside the block.
+
+    BLAS libraries read these variables once, when numpy is first imported,
+    and a spawned worker imports numpy while unpickling its task, before any
+    of its own code runs. So the variables are set here, in the parent, for
+    the workers to inherit, and restored afterwards.
+    """
+    env = thread_env(threads)
+    saved = {var: os.environ.get(var) for var in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def limit_threads(threads):
+    """Cap threads in this process: BLAS pools already loaded, and TensorFlow if imported later."""
+    from threadpoolctl import threadpool_limits
+    os.environ.update(thread_env(threads))
+    threadpool_limits(threads)
+
+
+def measure_latency(predict, X, repeats=200):
+    """Median single-row latency (ms) and batched throughput (rows/s)."""
+    row = X[:1]
+    predict(row)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - started)
+    batch = X[:min(len(X), 4096)]
+    started = time.perf_counter()
+    predict(batch)
+    elapsed = time.perf_counter() - started
+    return float(np.median(timings) * 1000), float(len(batch) / elapsed)
+
+
+def run_candidate(candidate, cache_dir, key, threads, out_dir):
+    """Train and evaluate one candidate in a worker process.
+
+    The train/test matrices are memory-mapped from the feature cache, so all
+    workers share a single physical copy.
+    """
+    limit_threads(threads)
+    arrays, _ = feature_cache.load(cache_dir, key)
+    X_train, X_test = arrays['X_train'], arrays['X_test']
+    y_train, y_test = arrays['y_train'], arrays['y_test']
+
+    started = time.perf_counter()
+    if candidate['kind'] == 'rf':
+        from sklearn.ensemble import RandomForestRegressor
+        model = RandomForestRegressor(n_estimators=candidate.get('n_estimators', 100),
+                                      random_state=42, n_jobs=threads)
+        model.fit(X_train, y_train)
+        train_seconds = time.perf_counter() - started
+        predict = model.predict
+        model_path = None
+    else:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        from tensorflow import keras
+        from numpy_model import export_weights, NumpyDenseModel
+        from train_model import build_model
+
+        model = build_model(X_train.shape[1], candidate['units'], candidate['dropout'])
+        callbacks = []
+        if candidate.get('early_stopping'):
+            callbacks.append(keras.callbacks.EarlyStopping(monitor='val_loss', patience=5,
+                                                           restore_best_weights=True))
+        model.fit(X_train, y_train, validation_split=0.2, epochs=candidate['epochs'],
+                  batch_size=candidate['batch_size'], callbacks=callbacks, verbose=0)
+        train_seconds = time.perf_counter() - started
+
+        model_path = os.path.join(out_dir, candidate['name'], 'model.keras')
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        model.save(model_path)
+        # Latency is measured on the NumPy engine, which is what makes the
+        # architecture (not framework dispatch) dominate serving cost
+        npz_path = os.path.join(out_dir, candidate['name'], 'model.npz')
+        export_weights(model, npz_path)
+        predict = NumpyDenseModel.load(npz_path).predict
+
+    X_eval = np.asarray(X_test, dtype=np.float32)
+    y_pred = np.asarray(predict(X_eval)).reshape(-1)
+    errors = y_pred - np.asarray(y_test)
+    latency_ms, throughput = measure_latency(predict, X_eval)
+    return dict(candidate,
+                mae=float(np.mean(np.abs(errors))),
+                rmse=float(np.sqrt(np.mean(errors ** 2))),
+                train_seconds=round(train_seconds, 2),
+                latency_ms=round(latency_ms, 4),
+                throughput_rows_per_s=round(throughput, 1),
+                threads=threads,
+                model_path=model_path)
+
+
+def served_model_dir(models_dir):
+    """The model the API serves by default: ``models_dir/CURRENT`` if set, else backend/."""
+    pointer = os.path.join(models_dir, 'CURRENT')
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            return os.path.join(models_dir, f.read().strip())
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def new_version_dir(out_root, prefix=''):
+    """Create ``out_root/<prefix><timestamp>`` and return its path; a second
+    directory in the same second gets a ``-1``, ``-2``... suffix."""
+    os.makedirs(out_root, exist_ok=True)
+    stamp = prefix + datetime.now().strftime('%Y%m%d-%H%M%S')
+    for n in itertools.count():
+        path = os.path.join(out_root, f"{stamp}-{n}" if n else stamp)
+        try:
+            os.mkdir(path)
+            return path
+        except FileExistsError:
+            continue
+
+
+def model_dir_mae(model_dir, data_path):
+    """Test MAE of the model saved in ``model_dir``, encoded by its own preprocessor."""
+    import joblib
+    from batch_score import load_model
+    from train_model import holdout_rows
+
+    engine = 'numpy' if os.path.exists(os.path.join(model_dir, 'model.npz')) else 'keras'
+    model, preprocessor = load_model(model_dir, engine)
+    X_test, y_test = holdout_rows(joblib.load(os.path.join(model_dir, 'preprocessor.joblib')), data_path)
+    predictions = np.asarray(model.predict(preprocessor.transform(X_test), batch_size=8192, verbose=0))
+    return float(np.mean(np.abs(predictions.reshape(-1) - y_test)))
+
+
+def search(data_path, candidates, cache_dir, out_root, threads_per_candidate=None, workers=None,
+           latency_budget_ms=1.0, promote=False, models_dir=None, max_mae_increase=0.0, force=False):
+    """Train ``candidates`` in parallel and pick the best servable one.
+
+    Workers get ``threads_per_candidate`` CPU threads each, and the pool is
+    sized to fill the machine. The winner is the neural network with the
+    lowest test MAE whose single-row latency is within ``latency_budget_ms``.
+    RandomForest candidates are reported as baselines only, since the API
+    serves Keras/NumPy models. With ``promote`` the winner replaces the
+    served model only if its MAE is at most ``max_mae_increase`` above the
+    served model's on the same test split, unless ``force`` is set.
+    """
+    from train_model import prepare_data_cached, preprocessing_params, save_artifacts
+
+    cpus = os.cpu_count() or 1
+    threads_per_candidate = threads_per_candidate or max(1, cpus // min(len(candidates), cpus))
+    workers = workers or max(1, cpus // threads_per_candidate)
+
+    run_dir = new_version_dir(out_root)
+
+    # Build (or reuse) the shared feature matrix once in the parent
+    key = feature_cache.cache_key(data_path, preprocessing_params())
+    _, preprocessor = prepare_data_cached(data_path, cache_dir, key=key)
+
+    print(f"Training {len(candidates)} candidates on {workers} workers x {threads_per_candidate} threads")
+    started = time.perf_counter()
+    results = []
+    # spawn: TensorFlow is not fork-safe
+    context = multiprocessing.get_context('spawn')
+    with worker_threads(threads_per_candidate), ProcessPoolExecutor(max_workers=workers,
+                                                                    mp_context=context) as pool:
+        futures = {pool.submit(run_candidate, c, cache_dir, key, threads_per_candidate, run_dir): c
+                   for c in candidates}
+        for future in as_completed(futures):
+            candidate = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = dict(candidate, error=str(e))
+                print(f"{candidate['name']}: failed: {e}")
+            else:
+                print(f"{result['name']}: MAE {result['mae']:.3f}, RMSE {result['rmse']:.3f}, "
+                      f"train {result['train_seconds']:.1f}s, latency {result['latency_ms']:.3f} ms")
+            results.append(result)
+    wall_seconds = time.perf_counter() - started
+
+    eligible = [r for r in results if 'error' not in r and r['kind'] == 'nn'
+                and r['latency_ms'] <= latency_budget_ms]
+    best = min(eligible, key=lambda r: r['mae']) if eligible else None
+
+    summary = {
+        'data': os.path.abspath(data_path),
+        'wall_seconds': round(wall_seconds, 2),
+        'workers': workers,
+        'threads_per_candidate': threads_per_candidate,
+        'latency_budget_ms': latency_budget_ms,
+        'best': best['name'] if best else None,
+        'results': sorted(results, key=lambda r: r.get('mae', float('inf'))),
+    }
+    current_dir = served_model_dir(models_dir) if promote else None
+    if best is not None and current_dir and os.path.exists(os.path.join(current_dir, 'preprocessor.joblib')):
+        # Same test split as the candidates, encoded by the served model's own preprocessor
+        try:
+            summary['served_model'] = {'model_dir': current_dir, 'mae': model_dir_mae(current_dir, data_path)}
+            print(f"Served model {current_dir}: MAE {summary['served_model']['mae']:.3f}")
+        except Exception as e:
+            summary['served_model'] = {'model_dir': current_dir, 'mae': None, 'error': str(e)}
+            print(f"Cannot score the served model {current_dir}: {e}")
+    with open(os.path.join(run_dir, 'results.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Search finished in {wall_seconds:.1f}s; results in {os.path.join(run_dir, 'results.json')}")
+
+    if best is None:
+        print(f"No neural network candidate met the {latency_budget_ms} ms latency budget")
+        return summary
+    print(f"Best candidate under budget: {best['name']} (MAE {best['mae']:.3f})")
+
+    if promote:
+        from tensorflow import keras
+        from retrain import promote_version
+
+        served = summary.get('served_model')
+        if served and not force and (served['mae'] is None or best['mae'] > served['mae'] + max_mae_increase):
+            print(f"Not promoting {best['name']}: it does not beat the served model (use --force)")
+            return summary
+
+        version_dir = new_version_dir(models_dir, prefix='search-')
+        save_artifacts(keras.models.load_model(best['model_path']), preprocessor, version_dir)
+        promote_version(models_dir, os.path.basename(version_dir))
+    return summary
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Train model candidates in parallel and pick the best")
+    parser.add_argument('--data', default='data_2.csv')
+    parser.add_argument('--candidates', help="JSON file with a list of candidates (default: built-in grid)")
+    parser.add_argument('--feature-cache', default='.feature_cache',
+                        help="Feature cache shared by the workers (see train_model.py --feature-cache)")
+    parser.add_argument('--out-root', default='search_runs')
+    parser.add_argument('--threads-per-candidate', type=int)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--latency-budget-ms', type=float, default=1.0,
+                        help="Max single-row NumPy-engine latency for the promoted model")
+    parser.add_argument('--promote', action='store_true',
+                        help="Save the winner as models/<version> and point models/CURRENT at it")
+    parser.add_argument('--max-mae-increase', type=float, default=0.0,
+                        help="Largest MAE regression (minutes) against the served model still promoted")
+    parser.add_argument('--force', action='store_true', help="Promote even if the served model is better")
+    parser.add_argument('--models-dir', default=os.path.join(base_dir, 'models'))
+    args = parser.parse_args()
+
+    candidates = DEFAULT_CANDIDATES
+    if args.candidates:
+        with open(args.candidates) as f:
+            candidates = json.load(f)
+
+    search(args.data, candidates, args.feature_cache, args.out_root,
+           threads_per_candidate=args.threads_per_candidate, workers=args.workers,
+           latency_budget_ms=args.latency_budget_ms, promote=args.promote, models_dir=args.models_dir,
+           max_mae_increase=args.max_mae_increase, force=args.force)
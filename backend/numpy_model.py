@@ -0,0 +1,177 @@
+import os
+import threading
+import numpy as np
+
+ACTIVATIONS = {
+    'linear': None,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+}
+
+# Storage precisions for the Dense kernels; biases always stay float32
+PRECISIONS = ('float32', 'float16', 'int8')
+
+
+def variant_path(path, precision):
+    """``model.npz`` -> ``model-int8.npz``, ``artifacts`` -> ``artifacts-int8``."""
+    if precision == 'float32':
+        return path
+    root, ext = os.path.splitext(path.rstrip(os.sep))
+    return f'{root}-{precision}{ext}'
+
+
+def quantize_kernel(kernel, precision):
+    """Return (stored kernel, scale) for one layer.
+
+    int8 uses one symmetric scale per layer: ``kernel ~= q * scale`` with
+    ``scale = max|kernel| / 127``. float16 and float32 have no scale.
+    """
+    kernel = np.asarray(kernel, dtype=np.float32)
+    if precision == 'float32':
+        return kernel, None
+    if precision == 'float16':
+        return kernel.astype(np.float16), None
+    if precision == 'int8':
+        scale = float(np.max(np.abs(kernel))) / 127.0 or 1.0
+        q = np.clip(np.rint(kernel / scale), -127, 127).astype(np.int8)
+        return q, np.float32(scale)
+    raise ValueError(f"Unknown precision {precision!r}; expected one of {PRECISIONS}")
+
+
+def dequantize_kernel(kernel, scale=None):
+    if kernel.dtype == np.int8:
+        if scale is None:
+            raise ValueError("int8 kernel without a scale")
+        return kernel.astype(np.float32) * np.float32(scale)
+    # asarray keeps memory-mapped float32 weights mapped instead of copying them
+    return np.asarray(kernel, dtype=np.float32)
+
+
+def export_weights(model, path, skip=(), extra=None):
+    """Write the Dense layers of a Keras Sequential model to a flat .npz.
+
+    Dropout (and other weightless layers) is the identity at inference and
+    is skipped. Arrays are stored as ``kernel_<i>``, ``bias_<i>`` and
+    ``activation_<i>`` for the i-th Dense layer. Layers named in ``skip``
+    are left to the caller, which can add arrays of its own via ``extra``.
+    """
+    arrays = dict(extra or {})
+    n = 0
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind == 'Dense':
+            activation = layer.get_config()['activation']
+            if isinstance(activation, dict):
+                activation = activation.get('config', {}).get('name', activation.get('class_name'))
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation {activation!r} in layer {layer.name}")
+            kernel, bias = layer.get_weights()
+            arrays[f'kernel_{n}'] = kernel.astype(np.float32)
+            arrays[f'bias_{n}'] = bias.astype(np.float32)
+            arrays[f'activation_{n}'] = np.array(activation)
+            n += 1
+        elif layer.get_weights() and layer.name not in skip:
+            raise ValueError(f"Unsupported layer {layer.name} ({kind})")
+    if n == 0:
+        raise ValueError("Model has no Dense layers")
+    arrays['n_layers'] = np.array(n)
+    np.savez(path, **arrays)
+
+
+class NumpyDenseModel:
+    """Pure-NumPy forward pass for the Dense regression model.
+
+    Matmuls run in float32 into per-thread activation buffers that are
+    allocated once and only grown when a larger batch arrives. ``predict``
+    takes the same arguments as ``keras.Model.predict`` so it can be used
+    as a drop-in replacement by the API.
+
+    Kernels may be stored as float16 or int8 (with per-layer ``scales``).
+    They are expanded to float32 once at load time into private memory,
+    because NumPy has no fast half-precision or integer GEMM. Reduced
+    precision therefore shrinks the files on disk, but not the memory or
+    the compute; only float32 kernels stay memory-mapped.
+    """
+
+    def __init__(self, kernels, biases, activations, scales=None):
+        scales = scales or [None] * len(kernels)
+        self.precision = {np.dtype(np.int8): 'int8', np.dtype(np.float16): 'float16'}.get(
+            np.asarray(kernels[0]).dtype, 'float32')
+        self.kernels = [dequantize_kernel(np.asarray(k), s) for k, s in zip(kernels, scales)]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activation_names = list(activations)
+        self.activations = [ACTIVATIONS[a] for a in activations]
+        self.input_dim = self.kernels[0].shape[0]
+        self._local = threading.local()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            n = int(f['n_layers'])
+            return cls([f[f'kernel_{i}'] for i in range(n)],
+                       [f[f'bias_{i}'] for i in range(n)],
+                       [str(f[f'activation_{i}']) for i in range(n)],
+                       [f[f'kernel_scale_{i}'] if f'kernel_scale_{i}' in f else None for i in range(n)])
+
+    def save(self, path, precision='float32'):
+        """Write the weights in ``export_weights`` format with kernels stored in ``precision``."""
+        arrays = {'n_layers': np.array(len(self.kernels))}
+        for i, (kernel, bias, activation) in enumerate(zip(self.kernels, self.biases, self.activation_names)):
+            arrays[f'kernel_{i}'], scale = quantize_kernel(kernel, precision)
+            if scale is not None:
+                arrays[f'kernel_scale_{i}'] = np.array(scale)
+            arrays[f'bias_{i}'] = bias
+            arrays[f'activation_{i}'] = np.array(activation)
+        np.savez(path, **arrays)
+
+    def quantized(self, precision):
+        """This model with kernels rounded to ``precision``, as served after a save/load."""
+        stored = [quantize_kernel(k, precision) for k in self.kernels]
+        return NumpyDenseModel([k for k, _ in stored], self.biases, self.activation_names,
+                               [s for _, s in stored])
+
+    def _buffers(self, n_rows):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None or buffers[0].shape[0] < n_rows:
+            capacity = max(n_rows, 64)
+            buffers = [np.empty((capacity, k.shape[1]), dtype=np.float32) for k in self.kernels]
+            self._local.buffers = buffers
+        return [b[:n_rows] for b in buffers]
+
+    def predict(self, X, batch_size=None, verbose=0):
+        x = np.asarray(X, dtype=np.float32)
+        if x.ndim != 2 or x.shape[1] != self.input_dim:
+            raise ValueError(f"Expected input of shape (n, {self.input_dim}), got {x.shape}")
+
+        for kernel, bias, activation, out in zip(self.kernels, self.biases,
+                                                 self.activations, self._buffers(len(x))):
+            np.matmul(x, kernel, out=out)
+            out += bias
+            if activation is not None:
+                activation(out)
+            x = out
+        # Callers may hold on to the result, so hand back a copy of the buffer
+        return x.copy()
+
+
+if __name__ == "__main__":
+    # python numpy_model.py [model.keras] [model.npz]
+    # Exports the weights and checks the NumPy forward pass against Keras.
+    import sys
+    from tensorflow import keras
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    model_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base_dir, 'model.keras')
+    npz_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(model_path)[0] + '.npz'
+
+    model = keras.models.load_model(model_path)
+    export_weights(model, npz_path)
+    print(f"Weights exported to {npz_path}")
+
+    engine = NumpyDenseModel.load(npz_path)
+    X = np.random.default_rng(0).normal(size=(4096, engine.input_dim)).astype(np.float32)
+    expected = model.predict(X, batch_size=4096, verbose=0)
+    actual = engine.predict(X)
+    max_err = float(np.max(np.abs(expected - actual)))
+    ok = np.allclose(expected, actual, rtol=1e-5, atol=1e-4)
+    print(f"Max abs difference vs Keras: {max_err:.2e} ({'OK' if ok else 'MISMATCH'})")
+    sys.exit(0 if ok else 1)
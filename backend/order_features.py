@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+
+def parse_created_at(values):
+    """Parse timestamps in one vectorized pass.
+
+    Returns (hours, dayofweeks, errors) where errors[i] is None for rows that
+    parsed. Values the ISO8601 fast path cannot handle (other formats, mixed
+    timezone offsets) fall back to the same per-value parsing /predict uses.
+    """
+    n = len(values)
+    hours = np.zeros(n, dtype=np.int64)
+    dayofweeks = np.zeros(n, dtype=np.int64)
+    errors = [None] * n
+
+    try:
+        parsed = pd.DatetimeIndex(pd.to_datetime(values, format='ISO8601', errors='coerce'))
+        hours[:] = parsed.hour.fillna(0).astype(np.int64)
+        dayofweeks[:] = parsed.dayofweek.fillna(0).astype(np.int64)
+        retry = np.flatnonzero(parsed.isna())
+    except (ValueError, TypeError):
+        retry = range(n)
+
+    for i in retry:
+        try:
+            dt = pd.to_datetime(values[i])
+            if pd.isna(dt):
+                raise ValueError(f"Invalid created_at: {values[i]!r}")
+            hours[i] = dt.hour
+            dayofweeks[i] = dt.dayofweek
+        except Exception as e:
+            errors[i] = str(e)
+
+    return hours, dayofweeks, errors
+
+
+def fitted_categories(preprocessor):
+    """(categorical columns, fitted categories) of a ColumnTransformer or CompiledPreprocessor."""
+    if hasattr(preprocessor, 'transformers_'):
+        _, encoder, columns = preprocessor.transformers_[1]
+        return list(columns), list(encoder.categories_)
+    return preprocessor.categorical_features, preprocessor.categories
+
+
+def conform_categoricals(columns, preprocessor):
+    """Cast categorical columns to the type of the categories ``preprocessor`` was fitted on.
+
+    ``columns`` is a DataFrame or a dict of lists (as /predict builds it); a
+    copy is returned. A value of the wrong type never matches a category, so
+    e.g. store '4' from the API would be encoded as unknown by a preprocessor
+    fitted on integer store codes. Values that are not numbers become NaN
+    (unknown) for numeric categories.
+    """
+    columns = columns.copy()
+    for name, categories in zip(*fitted_categories(preprocessor)):
+        values = columns[name]
+        numeric = _numeric(categories)
+        if isinstance(values, pd.Series):
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(values.cat.categories.dtype)
+            if numeric:
+                columns[name] = pd.to_numeric(values, errors='coerce')
+            elif values.dtype.kind in 'iuf':
+                columns[name] = values.map(_as_text)
+        else:
+            columns[name] = [_as_number(v) for v in values] if numeric else [_as_text(v) for v in values]
+    return columns
+
+
+def _numeric(categories):
+    if hasattr(categories, 'dtype'):
+        return categories.dtype.kind in 'iuf'
+    return all(isinstance(c, (int, float, np.number)) and not isinstance(c, bool) for c in categories)
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _as_text(value):
+    # Whole numbers as '4', not '4.0', like the CSV text they came from
+    if value is None or isinstance(value, str) or pd.isna(value):
+        return value
+    return str(int(value)) if float(value).is_integer() else str(value)
@@ -0,0 +1,217 @@
+import glob
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import registry
+from runtime_stats import pid_alive
+
+LOG_RECORDS = registry.counter('porter_prediction_log_records_total',
+                               'Prediction log records by outcome (queued, dropped, written, failed)',
+                               ('result',))
+LOG_BUFFERED = registry.gauge('porter_prediction_log_buffered', 'Records waiting in the prediction log buffer')
+
+# Raw order columns use the training CSV names so finished files can be fed
+# back to train_model.py; actual_delivery_time stays empty until the
+# delivery is labelled.
+INPUT_COLUMNS = [
+    ('market_id', 'float64'), ('created_at', 'string'), ('actual_delivery_time', 'string'),
+    ('store_primary_category', 'string'), ('order_protocol', 'float64'), ('total_items', 'int64'),
+    ('subtotal', 'int64'), ('num_distinct_items', 'int64'), ('min_item_price', 'int64'),
+    ('max_item_price', 'int64'), ('total_onshift_partners', 'float64'),
+    ('total_busy_partners', 'float64'), ('total_outstanding_orders', 'float64'),
+    ('estimated_store_to_consumer_driving_duration', 'float64'),
+]
+LOG_COLUMNS = INPUT_COLUMNS + [
+    ('order_hour', 'int64'), ('order_dayofweek', 'int64'),
+    ('predicted_delivery_time_minutes', 'float64'), ('model_version', 'string'),
+    ('latency_ms', 'float64'), ('endpoint', 'string'), ('logged_at', 'timestamp'),
+]
+
+FINISHED_SUFFIX = '.parquet'
+ACTIVE_SUFFIX = '.parquet.active'
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    types = {'float64': pa.float64(), 'int64': pa.int64(), 'string': pa.string(),
+             'timestamp': pa.timestamp('ms', tz='UTC')}
+    return pa.schema([(name, types[kind]) for name, kind in LOG_COLUMNS])
+
+
+class PredictionLog:
+    """Append-only Parquet log of served predictions.
+
+    ``record`` appends to a bounded in-memory buffer and never touches the
+    disk. When the buffer is full the record is dropped and counted. A
+    background thread flushes the buffer every ``flush_seconds`` (or once
+    ``flush_rows`` are waiting) as one row group of the active file. The
+    file is rotated after ``rotate_bytes`` or ``rotate_seconds``. Files are
+    written as ``*.parquet.active`` and renamed to ``*.parquet`` once
+    closed, so readers only ever see complete files.
+    """
+
+    def __init__(self, log_dir, buffer_size=100_000, flush_rows=10_000, flush_seconds=5.0,
+                 rotate_bytes=64 << 20, rotate_seconds=3600.0, compression='zstd'):
+        self.log_dir = log_dir
+        self.buffer_size = buffer_size
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compression = compression
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.files = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._writer = None
+        self._path = None
+        self._opened_at = None
+
+    def record(self, rows):
+        """Queue ``rows`` (dicts keyed by LOG_COLUMNS names); returns how many were dropped."""
+        with self._lock:
+            room = self.buffer_size - len(self._buffer)
+            accepted = rows[:max(room, 0)]
+            self._buffer.extend(accepted)
+            dropped = len(rows) - len(accepted)
+            self.queued += len(accepted)
+            self.dropped += dropped
+            full = len(self._buffer) >= self.flush_rows
+        LOG_RECORDS.inc('queued', amount=len(accepted))
+        if dropped:
+            LOG_RECORDS.inc('dropped', amount=dropped)
+        if full:
+            self._wake.set()
+        return dropped
+
+    def start(self):
+        _arrow_schema()  # fail at startup, not in the writer thread, if pyarrow is missing
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Flush what is buffered and finish the active file."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {"log_dir": os.path.abspath(self.log_dir), "buffered": buffered, "queued": self.queued,
+                "dropped": self.dropped, "written": self.written, "failed": self.failed,
+                "files": self.files}
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self._flush()
+        self._flush()
+        self._rotate()
+
+    def _flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if rows:
+            try:
+                self._write(rows)
+                self.written += len(rows)
+                LOG_RECORDS.inc('written', amount=len(rows))
+            except Exception as e:
+                # Never let a disk problem take the API down; count and move on
+                self.failed += len(rows)
+                LOG_RECORDS.inc('failed', amount=len(rows))
+                print(f"Prediction log write failed, {len(rows)} records lost: {e}")
+                self._rotate()
+        if self._writer is not None and (
+                os.path.getsize(self._path) >= self.rotate_bytes
+                or time.monotonic() - self._opened_at >= self.rotate_seconds):
+            self._rotate()
+
+    def _write(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _arrow_schema()
+        columns = {name: [row.get(name) for row in rows] for name in schema.names}
+        table = pa.Table.from_pydict(columns, schema=schema)
+        if self._writer is None:
+            stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+            self._path = os.path.join(self.log_dir, f'predictions-{stamp}-{os.getpid()}-{self.files}'
+                                                    + ACTIVE_SUFFIX)
+            self._writer = pq.ParquetWriter(self._path, schema, compression=self.compression)
+            self._opened_at = time.monotonic()
+            self.files += 1
+        self._writer.write_table(table)
+
+    def _rotate(self):
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+            os.replace(self._path, self._path[:-len(ACTIVE_SUFFIX)] + FINISHED_SUFFIX)
+        except Exception as e:
+            print(f"Could not finish prediction log {self._path}: {e}")
+        self._writer, self._path = None, None
+
+    def _recover(self):
+        """Files left active by a dead process have no footer; set them aside."""
+        for path in glob.glob(os.path.join(self.log_dir, '*' + ACTIVE_SUFFIX)):
+            pid = int(os.path.basename(path).split('-')[3])
+            if not pid_alive(pid):
+                os.replace(path, path + '.incomplete')
+
+
+def log_files(paths):
+    """Expand files and directories into the finished prediction log files they contain."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*' + FINISHED_SUFFIX))))
+        else:
+            files.append(path)
+    return files
+
+
+def _normalize_timestamps(values):
+    """Wall-clock 'YYYY-mm-dd HH:MM:SS' strings, as in the training CSV.
+
+    The API accepts any format pandas parses (with or without an offset), so
+    values are parsed one by one; unparseable ones become None.
+    """
+    import pandas as pd
+
+    out = []
+    for value in values:
+        try:
+            ts = pd.Timestamp(value)
+            out.append(None if pd.isna(ts) else ts.tz_localize(None).strftime('%Y-%m-%d %H:%M:%S'))
+        except (ValueError, TypeError):
+            out.append(None)
+    return out
+
+
+def read_prediction_logs(paths):
+    """Prediction log rows as a DataFrame in the training CSV's format."""
+    import pandas as pd
+
+    files = log_files(paths)
+    if not files:
+        return pd.DataFrame(columns=[name for name, _ in LOG_COLUMNS])
+    df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+    for column in ('created_at', 'actual_delivery_time'):
+        df[column] = _normalize_timestamps(df[column])
+    return df
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import joblib
+import numpy as np
+
+from embedding_model import VOCABULARY_FILE
+from fast_preprocess import CompiledPreprocessor
+from numpy_model import NumpyDenseModel, PRECISIONS, variant_path
+from serving_artifacts import export_artifacts
+
+
+def remove_variant(model_dir, precision):
+    """Delete a previously written ``precision`` variant so it cannot be served stale."""
+    path = variant_path(os.path.join(model_dir, 'model.npz'), precision)
+    if os.path.exists(path):
+        os.remove(path)
+    shutil.rmtree(variant_path(os.path.join(model_dir, 'artifacts'), precision), ignore_errors=True)
+
+
+def quantize(model_dir, data_path, precisions=('float16', 'int8'), max_mae_increase=0.1):
+    """Write reduced-precision variants of ``model_dir``'s model that pass the MAE gate.
+
+    Each variant is evaluated on the held-out test split of ``data_path``
+    (the same split ``train_model.py`` uses), encoded by the model's own
+    ``preprocessor.joblib``. A variant whose test MAE is
+    more than ``max_mae_increase`` minutes above the float32 model is
+    rejected, and any earlier variant of that precision is removed. Accepted variants are written
+    as ``model-<precision>.npz`` and ``artifacts-<precision>/``.
+    Returns the report, which is also saved as ``quantization.json``.
+    """
+    from train_model import holdout_rows
+
+    if os.path.exists(os.path.join(model_dir, VOCABULARY_FILE)):
+        raise ValueError(f"{model_dir} holds an embedding model; only one-hot models can be quantized")
+    model_path = os.path.join(model_dir, 'model.npz')
+    model = NumpyDenseModel.load(model_path)
+    preprocessor = joblib.load(os.path.join(model_dir, 'preprocessor.joblib'))
+    compiled = CompiledPreprocessor(preprocessor)
+
+    X_raw, y_test = holdout_rows(preprocessor, data_path)
+    X_test = compiled.transform(X_raw)
+    if X_test.shape[1] != model.input_dim:
+        raise ValueError(f"{model_dir}/preprocessor.joblib produces {X_test.shape[1]} features but "
+                         f"model.npz expects {model.input_dim}")
+
+    def mae(engine):
+        return float(np.mean(np.abs(engine.predict(X_test)[:, 0] - y_test)))
+
+    baseline = mae(model)
+    print(f"float32: test MAE {baseline:.4f} minutes, {os.path.getsize(model_path)} bytes")
+    report = {'data': os.path.abspath(data_path), 'max_mae_increase': max_mae_increase,
+              'float32': {'mae': baseline, 'bytes': os.path.getsize(model_path)}}
+
+    for precision in precisions:
+        variant = model.quantized(precision)
+        variant_mae = mae(variant)
+        entry = {'mae': variant_mae, 'mae_increase': variant_mae - baseline}
+        if variant_mae > baseline + max_mae_increase:
+            entry['accepted'] = False
+            remove_variant(model_dir, precision)
+            print(f"{precision}: test MAE {variant_mae:.4f} (+{variant_mae - baseline:.4f}) exceeds the "
+                  f"{max_mae_increase} minute budget; not written")
+        else:
+            path = variant_path(model_path, precision)
+            model.save(path, precision)
+            export_artifacts(model, compiled, variant_path(os.path.join(model_dir, 'artifacts'), precision),
+                             precision)
+            entry.update(accepted=True, bytes=os.path.getsize(path))
+            print(f"{precision}: test MAE {variant_mae:.4f} ({variant_mae - baseline:+.4f}), "
+                  f"{entry['bytes']} bytes -> {path}")
+        report[precision] = entry
+
+    with open(os.path.join(model_dir, 'quantization.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(
+        description="Write float16/int8 variants of the model behind an MAE gate",
+        epilog="Variants only reduce disk size: their weights are widened to float32 when loaded, "
+               "so memory use and speed match float32 (and they are not memory-mapped across workers).")
+    parser.add_argument('--model-dir', default=base_dir, help="Directory with model.npz and preprocessor.joblib")
+    parser.add_argument('--data', default='data_2.csv', help="CSV the model was trained on (for the test split)")
+    parser.add_argument('--precisions', default='float16,int8')
+    parser.add_argument('--max-mae-increase', type=float, default=0.1,
+                        help="Reject a variant whose test MAE exceeds float32's by more than this many minutes")
+    args = parser.parse_args()
+
+    precisions = [p for p in args.precisions.split(',') if p]
+    unknown = [p for p in precisions if p not in PRECISIONS or p == 'float32']
+    if unknown:
+        sys.exit(f"Unknown precisions {unknown}; choose from float16, int8")
+
+    report = quantize(args.model_dir, args.data, precisions, args.max_mae_increase)
+    sys.exit(0 if all(report[p]['accepted'] for p in precisions) else 1)
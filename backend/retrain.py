@@ -0,0 +1,152 @@
+import argparse
+import json
+import math
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from tensorflow import keras
+
+from embedding_model import load_vocabulary, split_inputs
+from model_search import new_version_dir, served_model_dir
+from order_features import conform_categoricals
+from streaming_train import iter_chunks
+from train_model import (NUMERIC_FEATURES, CATEGORICAL_FEATURES, TARGET, fill_missing,
+                         add_target_and_time_features, save_artifacts, parse_timestamps)
+
+
+def load_recent_orders(data_path, since=None, last_days=None, chunksize=100_000):
+    """Rows with created_at >= since (or within last_days of the newest order).
+
+    The CSV is read in chunks and only the matching slice is kept in memory.
+    """
+    if since is None and last_days is None:
+        raise ValueError("Pass since or last_days")
+    if since is None:
+        newest = max(parse_timestamps(chunk['created_at']).max()
+                     for chunk in iter_chunks(data_path, chunksize))
+        since = newest - pd.Timedelta(days=last_days)
+    since = pd.Timestamp(since)
+
+    parts = []
+    for chunk in iter_chunks(data_path, chunksize):
+        created_at = parse_timestamps(chunk['created_at'])
+        parts.append(chunk[created_at >= since])
+    df = pd.concat(parts) if parts else pd.DataFrame()
+    print(f"Selected {len(df)} orders created since {since}")
+    return df
+
+
+def promote_version(out_root, version):
+    """Atomically point ``out_root/CURRENT`` at ``out_root/<version>``."""
+    pointer = os.path.join(out_root, 'CURRENT')
+    tmp = pointer + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(version)
+    os.replace(tmp, pointer)
+    print(f"Promoted {version} ({pointer})")
+
+
+def fine_tune(model_dir, data_path, out_root, since=None, last_days=None, epochs=3,
+              batch_size=128, learning_rate=1e-4, holdout=0.2, max_mae_increase=0.0,
+              promote=False, force=False):
+    """Warm-start the model in ``model_dir`` on the newest order slice.
+
+    The preprocessor is reused unchanged so the new version stays compatible
+    with the serving code; only the network weights move. The slice is split
+    into fine-tuning and holdout rows, and the result is written to
+    ``out_root/<version>/``. With ``promote`` the ``out_root/CURRENT`` pointer
+    is switched to it (atomically) if holdout MAE did not get worse by more
+    than ``max_mae_increase`` minutes, unless ``force`` is set. A version
+    whose holdout MAE could not be measured (e.g. an empty holdout) is never
+    promoted.
+    """
+    model = keras.models.load_model(os.path.join(model_dir, 'model.keras'))
+    preprocessor = joblib.load(os.path.join(model_dir, 'preprocessor.joblib'))
+    vocabulary = load_vocabulary(model_dir)
+
+    def inputs(X):
+        # Embedding models take [numeric, categorical codes]
+        return list(split_inputs(X, vocabulary)) if vocabulary is not None else X
+
+    df = load_recent_orders(data_path, since, last_days)
+    if df.empty:
+        raise ValueError("No orders in the requested slice")
+    medians = {c: df[c].median() for c in NUMERIC_FEATURES if c in df.columns}
+    modes = {c: df[c].mode()[0] for c in CATEGORICAL_FEATURES if c in df.columns}
+    df = add_target_and_time_features(fill_missing(df, medians, modes))
+
+    X = preprocessor.transform(conform_categoricals(df[list(preprocessor.feature_names_in_)], preprocessor))
+    X = X.astype(np.float32)
+    y = df[TARGET].to_numpy(dtype=np.float32)
+    rng = np.random.default_rng(42)
+    is_holdout = rng.random(len(X)) < holdout
+    X_fit, y_fit, X_hold, y_hold = X[~is_holdout], y[~is_holdout], X[is_holdout], y[is_holdout]
+
+    def holdout_mae():
+        # NaN for an empty holdout, which blocks promotion
+        if len(X_hold) == 0:
+            return float('nan')
+        return float(np.mean(np.abs(model.predict(inputs(X_hold), verbose=0)[:, 0] - y_hold)))
+
+    mae_before = holdout_mae()
+    print(f"Holdout MAE before fine-tuning: {mae_before:.2f} minutes ({len(X_hold)} orders)")
+
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate), loss='mse', metrics=['mae'])
+    model.fit(inputs(X_fit), y_fit, epochs=epochs, batch_size=batch_size, verbose=1)
+
+    mae_after = holdout_mae()
+    print(f"Holdout MAE after fine-tuning: {mae_after:.2f} minutes")
+
+    out_dir = new_version_dir(out_root)
+    version = os.path.basename(out_dir)
+    save_artifacts(model, preprocessor, out_dir, vocabulary)
+    with open(os.path.join(out_dir, 'version.json'), 'w') as f:
+        json.dump({
+            'version': version,
+            'parent': os.path.abspath(model_dir),
+            'data': os.path.abspath(data_path),
+            'since': str(since) if since is not None else None,
+            'last_days': last_days,
+            'rows': int(len(X)),
+            'epochs': epochs,
+            'holdout_mae_before': mae_before,
+            'holdout_mae_after': mae_after,
+        }, f, indent=2)
+    print(f"Version {version} written to {out_dir}")
+
+    if promote:
+        if not (math.isfinite(mae_before) and math.isfinite(mae_after)):
+            print(f"Not promoting {version}: holdout MAE is not finite ({mae_before} -> {mae_after}, "
+                  f"{len(X_hold)} holdout orders)")
+        elif mae_after > mae_before + max_mae_increase and not force:
+            print(f"Not promoting {version}: holdout MAE got worse ({mae_before:.2f} -> {mae_after:.2f})")
+        else:
+            promote_version(out_root, version)
+    return out_dir
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Fine-tune the current model on recent orders")
+    parser.add_argument('--data', default='data_2.csv')
+    parser.add_argument('--model-dir', default=None,
+                        help="Model to start from (default: OUT_ROOT/CURRENT if set, else backend/)")
+    parser.add_argument('--out-root', default=os.path.join(base_dir, 'models'),
+                        help="Versioned models are written to OUT_ROOT/<version>/")
+    slice_group = parser.add_mutually_exclusive_group(required=True)
+    slice_group.add_argument('--since', help="Use orders created at or after this timestamp")
+    slice_group.add_argument('--last-days', type=float, help="Use orders from the last N days of the data")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--learning-rate', type=float, default=1e-4)
+    parser.add_argument('--max-mae-increase', type=float, default=0.0,
+                        help="Largest holdout MAE regression (minutes) still promoted")
+    parser.add_argument('--promote', action='store_true', help="Point OUT_ROOT/CURRENT at the new version")
+    parser.add_argument('--force', action='store_true', help="Promote even if holdout MAE got worse")
+    args = parser.parse_args()
+
+    fine_tune(args.model_dir or served_model_dir(args.out_root), args.data, args.out_root, since=args.since, last_days=args.last_days,
+              epochs=args.epochs, batch_size=args.batch_size, learning_rate=args.learning_rate,
+              max_mae_increase=args.max_mae_increase, promote=args.promote, force=args.force)
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from fast_preprocess import CompiledPreprocessor
+from numpy_model import NumpyDenseModel, quantize_kernel
+
+ARTIFACT_FORMAT_VERSION = 1
+
+
+def export_artifacts(engine, compiled, out_dir, precision='float32'):
+    """Write model weights and preprocessing parameters as raw .npy files.
+
+    Every array is stored uncompressed so ``load_artifacts`` can memory-map
+    it; worker processes mapping the same files share one physical copy
+    through the page cache. Non-array metadata goes to ``manifest.json``.
+    The directory is staged next to ``out_dir`` and swapped in at the end.
+    Kernels are written in ``precision`` (see ``numpy_model.PRECISIONS``).
+    """
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.artifacts-', dir=parent)
+
+    params = compiled.params()
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'n_layers': len(engine.kernels),
+        'precision': precision,
+        'activations': engine.activation_names,
+        'numeric_features': params['numeric_features'],
+        'categorical_features': params['categorical_features'],
+        'categories': params['categories'],
+        'has_mean': params['mean'] is not None,
+        'has_scale': params['scale'] is not None,
+    }
+    for i, (kernel, bias) in enumerate(zip(engine.kernels, engine.biases)):
+        stored, scale = quantize_kernel(kernel, precision)
+        np.save(os.path.join(staging, f'kernel_{i}.npy'), stored)
+        if scale is not None:
+            np.save(os.path.join(staging, f'kernel_scale_{i}.npy'), np.asarray(scale))
+        np.save(os.path.join(staging, f'bias_{i}.npy'), bias)
+    if params['mean'] is not None:
+        np.save(os.path.join(staging, 'scaler_mean.npy'), np.asarray(params['mean'], dtype=np.float64))
+    if params['scale'] is not None:
+        np.save(os.path.join(staging, 'scaler_scale.npy'), np.asarray(params['scale'], dtype=np.float64))
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(out_dir):
+        old = out_dir + '.old'
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(out_dir, old)
+        os.replace(staging, out_dir)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(staging, out_dir)
+
+
+def fingerprint(paths):
+    """Short content hash of the given files (directories are walked in order)."""
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path))
+        else:
+            files = [path]
+        for name in files:
+            digest.update(os.path.basename(name).encode())
+            with open(name, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def load_artifacts(artifact_dir, mmap=True):
+    """Load (NumpyDenseModel, CompiledPreprocessor) from ``export_artifacts`` output."""
+    with open(os.path.join(artifact_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format: {manifest.get('format_version')}")
+
+    mode = 'r' if mmap else None
+    load = lambda name: np.load(os.path.join(artifact_dir, name), mmap_mode=mode)
+
+    n = manifest['n_layers']
+    # Reduced-precision kernels are expanded to float32 in private memory
+    scaled = manifest.get('precision') == 'int8'
+    engine = NumpyDenseModel([load(f'kernel_{i}.npy') for i in range(n)],
+                             [load(f'bias_{i}.npy') for i in range(n)],
+                             manifest['activations'],
+                             [load(f'kernel_scale_{i}.npy') if scaled else None for i in range(n)])
+    compiled = CompiledPreprocessor.from_params(
+        manifest['numeric_features'],
+        load('scaler_mean.npy') if manifest['has_mean'] else None,
+        load('scaler_scale.npy') if manifest['has_scale'] else None,
+        manifest['categorical_features'],
+        manifest['categories'],
+    )
+    return engine, compiled
+
+
+if __name__ == "__main__":
+    # python serving_artifacts.py [model.npz] [preprocessor.joblib] [artifacts/]
+    import sys
+    import joblib
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    npz_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base_dir, 'model.npz')
+    preprocessor_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, 'preprocessor.joblib')
+    out_dir = sys.argv[3] if len(sys.argv) > 3 else os.path.join(base_dir, 'artifacts')
+
+    export_artifacts(NumpyDenseModel.load(npz_path),
+                     CompiledPreprocessor(joblib.load(preprocessor_path)),
+                     out_dir)
+    print(f"Serving artifacts written to {out_dir}")
@@ -0,0 +1,250 @@
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from runtime_stats import peak_rss_mb
+from train_model import (NUMERIC_FEATURES, TIME_FEATURES, TARGET,
+                         fill_missing, add_target_and_time_features, select_features,
+                         build_preprocessor, build_model, save_artifacts, read_orders_csv)
+
+TRAIN, VALIDATION, TEST = 0, 1, 2
+
+
+def iter_chunks(path, chunksize):
+    yield from read_orders_csv(path, chunksize=chunksize)
+
+
+def split_buckets(row_index, test_size=0.2, validation_size=0.2, seed=42):
+    """Assign rows to TRAIN/VALIDATION/TEST by hashing their position in the file.
+
+    The split is stable across passes and chunk sizes: ``test_size`` of all rows
+    go to TEST and ``validation_size`` of the remainder to VALIDATION, matching
+    the in-memory split proportions.
+    """
+    # splitmix64 finalizer -> uniform [0, 1)
+    x = np.asarray(row_index, dtype=np.uint64) + np.uint64((seed * 0x9E3779B97F4A7C15) % (1 << 64))
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    u = (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+    buckets = np.full(len(u), TRAIN, dtype=np.int8)
+    buckets[u < test_size + (1 - test_size) * validation_size] = VALIDATION
+    buckets[u < test_size] = TEST
+    return buckets
+
+
+class ReservoirSample:
+    """Bounded uniform sample of a stream, used for approximate medians.
+
+    Each value gets a random key and the ``size`` smallest keys are kept, so
+    the sample is uniform over everything seen. While fewer than ``size``
+    values have arrived the median is exact.
+    """
+
+    def __init__(self, size=200_000, seed=0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.values = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        keys = np.concatenate([self.keys, self.rng.random(len(values))])
+        values = np.concatenate([self.values, values])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, values = keys[keep], values[keep]
+        self.keys, self.values = keys, values
+
+    def median(self):
+        return float(np.median(self.values)) if len(self.values) else np.nan
+
+
+class RunningMoments:
+    """Count/mean/M2 per column, merged chunk by chunk (Chan et al.)."""
+
+    def __init__(self, n_columns):
+        self.n = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def merge(self, n, mean, m2):
+        total = self.n + n
+        safe = np.where(total > 0, total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / safe
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * n / safe
+        self.n = total
+
+    def update(self, X):
+        """Add the non-NaN values of each column of ``X``."""
+        X = np.asarray(X, dtype=np.float64)
+        n = np.sum(~np.isnan(X), axis=0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, np.nansum(X, axis=0) / np.where(n > 0, n, 1), 0.0)
+            m2 = np.where(n > 0, np.nansum((X - mean) ** 2, axis=0), 0.0)
+        self.merge(n, mean, m2)
+
+    def variance(self):
+        return np.where(self.n > 0, self.m2 / np.where(self.n > 0, self.n, 1), 0.0)
+
+
+def compute_statistics(path, chunksize=100_000, reservoir_size=200_000):
+    """One streaming pass: imputation values, scaler moments and categories.
+
+    Medians and modes are taken over all rows (as in the in-memory pipeline);
+    scaler moments and categories only over TRAIN rows, with missing values
+    accounted for as the imputed median/mode afterwards.
+    """
+    stats = None
+    n_rows = 0
+    for chunk in iter_chunks(path, chunksize):
+        if stats is None:
+            numeric_features, categorical_features = select_features(list(chunk.columns) + TIME_FEATURES)
+            raw_numeric = [c for c in NUMERIC_FEATURES if c in chunk.columns]
+            stats = {
+                'numeric_features': numeric_features,
+                'categorical_features': categorical_features,
+                'samples': {c: ReservoirSample(reservoir_size, seed=i) for i, c in enumerate(raw_numeric)},
+                'counts': {c: {} for c in categorical_features},
+                'moments': RunningMoments(len(numeric_features)),
+                'train_nan': np.zeros(len(numeric_features)),
+                'categories': {c: set() for c in categorical_features},
+                'train_cat_nan': {c: False for c in categorical_features},
+                'bucket_rows': np.zeros(3, dtype=np.int64),
+            }
+        n_rows += len(chunk)
+
+        # Imputation statistics over every row
+        for c, sample in stats['samples'].items():
+            sample.update(chunk[c].dropna().to_numpy())
+        for c, counts in stats['counts'].items():
+            for value, count in chunk[c].value_counts().items():
+                counts[value] = counts.get(value, 0) + count
+
+        # Scaler moments and categories over training rows
+        clean = add_target_and_time_features(chunk.copy())
+        buckets = split_buckets(clean.index.to_numpy())
+        stats['bucket_rows'] += np.bincount(buckets, minlength=3)
+        train = clean[buckets == TRAIN]
+        X = train[stats['numeric_features']].to_numpy(dtype=np.float64)
+        stats['moments'].update(X)
+        stats['train_nan'] += np.isnan(X).sum(axis=0)
+        for c in stats['categorical_features']:
+            stats['categories'][c].update(train[c].dropna().tolist())
+            stats['train_cat_nan'][c] |= bool(train[c].isna().any())
+
+    if stats is None:
+        raise ValueError(f"No rows in {path}")
+
+    medians = {c: s.median() for c, s in stats['samples'].items()}
+    # Ties resolve to the smallest value, like Series.mode()[0]
+    modes = {c: min(counts.items(), key=lambda kv: (-kv[1], kv[0]))[0]
+             for c, counts in stats['counts'].items() if counts}
+
+    # Missing training values are filled with the median: fold them in as
+    # train_nan extra points at the median with zero spread
+    moments = stats['moments']
+    fill = np.array([medians.get(c, 0.0) for c in stats['numeric_features']])
+    moments.merge(stats['train_nan'], fill, np.zeros_like(fill))
+
+    categories = {}
+    for c in stats['categorical_features']:
+        values = stats['categories'][c]
+        if stats['train_cat_nan'][c] and c in modes:
+            values.add(modes[c])
+        categories[c] = sorted(values)
+
+    print(f"Streamed {n_rows} rows; train/validation/test rows: {stats['bucket_rows'].tolist()}")
+    return {
+        'numeric_features': stats['numeric_features'],
+        'categorical_features': stats['categorical_features'],
+        'medians': medians,
+        'modes': modes,
+        'mean': moments.mean,
+        'var': moments.variance(),
+        'n_samples': moments.n,
+        'categories': categories,
+        'bucket_rows': stats['bucket_rows'],
+    }
+
+
+def fitted_preprocessor(stats):
+    """ColumnTransformer with the streamed statistics, as train_model.py would fit it."""
+    numeric_features = stats['numeric_features']
+    categorical_features = stats['categorical_features']
+    preprocessor = build_preprocessor(numeric_features, categorical_features)
+
+    # Fit the structure on a small frame that contains exactly the observed
+    # categories, then install the streamed scaler statistics
+    n = max([len(v) for v in stats['categories'].values()] + [1])
+    frame = pd.DataFrame({c: np.zeros(n) for c in numeric_features})
+    for c in categorical_features:
+        values = stats['categories'][c]
+        frame[c] = [values[i % len(values)] for i in range(n)]
+    preprocessor.fit(frame)
+
+    scaler = preprocessor.named_transformers_['num']
+    scaler.mean_ = stats['mean'].copy()
+    scaler.var_ = stats['var'].copy()
+    scale = np.sqrt(scaler.var_)
+    scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.0
+    scaler.scale_ = scale
+    scaler.n_samples_seen_ = stats['n_samples'].astype(np.int64)
+    return preprocessor
+
+
+def make_dataset(path, preprocessor, stats, bucket, batch_size=128, chunksize=100_000,
+                 shuffle=False, seed=42):
+    """tf.data pipeline over one split, reading the CSV chunk by chunk."""
+    features = stats['numeric_features'] + stats['categorical_features']
+    n_features = len(preprocessor.get_feature_names_out())
+    rng = np.random.default_rng(seed)
+
+    def generate():
+        for chunk in iter_chunks(path, chunksize):
+            chunk = fill_missing(chunk, stats['medians'], stats['modes'])
+            chunk = add_target_and_time_features(chunk)
+            chunk = chunk[split_buckets(chunk.index.to_numpy()) == bucket]
+            if chunk.empty:
+                continue
+            X = preprocessor.transform(chunk[features]).astype(np.float32)
+            y = chunk[TARGET].to_numpy(dtype=np.float32)
+            order = rng.permutation(len(X)) if shuffle else np.arange(len(X))
+            for start in range(0, len(X), batch_size):
+                rows = order[start:start + batch_size]
+                yield X[rows], y[rows]
+
+    dataset = tf.data.Dataset.from_generator(
+        generate,
+        output_signature=(tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+                          tf.TensorSpec(shape=(None,), dtype=tf.float32)))
+    if shuffle:
+        # Mix batches from neighbouring chunks with bounded memory
+        dataset = dataset.shuffle(64, seed=seed)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def train_streaming(data_path='data_2.csv', epochs=20, batch_size=128, chunksize=100_000,
+                    reservoir_size=200_000, out_dir='.'):
+    print(f"Streaming {data_path} in chunks of {chunksize} rows...")
+    stats = compute_statistics(data_path, chunksize, reservoir_size)
+    preprocessor = fitted_preprocessor(stats)
+
+    train_ds = make_dataset(data_path, preprocessor, stats, TRAIN, batch_size, chunksize, shuffle=True)
+    val_ds = make_dataset(data_path, preprocessor, stats, VALIDATION, batch_size, chunksize)
+    test_ds = make_dataset(data_path, preprocessor, stats, TEST, batch_size, chunksize)
+
+    print("Building model...")
+    model = build_model(len(preprocessor.get_feature_names_out()))
+
+    print("Training model...")
+    model.fit(train_ds, validation_data=val_ds, epochs=epochs, verbose=1)
+
+    loss, mae = model.evaluate(test_ds)
+    print(f"Test MAE: {mae:.2f} minutes")
+    print(f"Peak RSS: {peak_rss_mb():.1f} MB")
+
+    save_artifacts(model, preprocessor, out_dir)
+    return model, preprocessor
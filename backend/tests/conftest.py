@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope='session')
+def data_path():
+    """The training CSV: PORTER_TEST_DATA, else backend/data_2.csv; skips the test if neither exists."""
+    path = os.environ.get('PORTER_TEST_DATA', os.path.join(BACKEND_DIR, 'data_2.csv'))
+    if not os.path.exists(path):
+        pytest.skip(f"{path} not found (set PORTER_TEST_DATA)")
+    return path
+
+
+@pytest.fixture(scope='session')
+def shipped_preprocessor():
+    import joblib
+    return joblib.load(os.path.join(BACKEND_DIR, 'preprocessor.joblib'))
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+from fastapi.testclient import TestClient
+
+import main
+
+ORDER = {
+    'market_id': 1.0, 'store_primary_category': '4', 'order_protocol': 1.0, 'total_items': 2,
+    'subtotal': 1500, 'num_distinct_items': 2, 'min_item_price': 500, 'max_item_price': 1000,
+    'total_outstanding_orders': 10, 'estimated_store_to_consumer_driving_duration': 400,
+    'created_at': '2024-11-27T20:00:00Z',
+}
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    if main.prediction_cache is not None:
+        main.prediction_cache.clear()
+
+
+def test_batch_reports_bad_entries_per_item(client):
+    orders = [ORDER, 'not an order', dict(ORDER, subtotal='inf'), dict(ORDER, market_id='nan'),
+              dict(ORDER, created_at='yesterday-ish')]
+    response = client.post('/predict/batch', json={'orders': orders})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['count'] == 5 and body['errors'] == 4
+    assert 'predicted_delivery_time_minutes' in body['predictions'][0]
+    assert [p['index'] for p in body['predictions'] if 'error' in p] == [1, 2, 3, 4]
+
+
+def test_predict_rejects_non_finite_inputs(client):
+    assert client.post('/predict', json=dict(ORDER, estimated_store_to_consumer_driving_duration='inf')).status_code == 422
+    assert client.post('/predict', json=dict(ORDER, market_id='nan')).status_code == 422
+
+
+def test_non_finite_prediction_is_an_item_error_and_not_cached(client, monkeypatch):
+    predict_rows = main.predict_rows
+    monkeypatch.setattr(main, 'predict_rows', lambda orders, *args: np.full(len(orders), np.nan))
+    other = dict(ORDER, subtotal=2500)
+    body = client.post('/predict/batch', json={'orders': [ORDER, other]}).json()
+    assert body['errors'] == 2
+    assert client.post('/predict', json=ORDER).status_code == 400
+
+    monkeypatch.setattr(main, 'predict_rows', predict_rows)
+    body = client.post('/predict/batch', json={'orders': [ORDER, other]}).json()
+    assert body['errors'] == 0
+    assert all(np.isfinite(p['predicted_delivery_time_minutes']) for p in body['predictions'])
+
+
+class ConstantModel:
+    def predict(self, X, batch_size=None, verbose=0):
+        return np.full((len(X), 1), 999.0)
+
+
+def test_reload_mid_request_keeps_the_request_on_its_bundle(client, monkeypatch):
+    expected = client.post('/predict', json=ORDER).json()['predicted_delivery_time_minutes']
+    main.prediction_cache.clear()
+    serving = main.bundle
+    swapped = main.ServingBundle(ConstantModel(), serving.preprocessor, serving.compiled_preprocessor,
+                                 'swapped', serving.model_dir)
+
+    def swap_after(function):
+        def wrapper(*args, **kwargs):
+            monkeypatch.setattr(main, 'bundle', swapped)
+            return function(*args, **kwargs)
+        return wrapper
+
+    # Both endpoints swap the bundle after enriching the order, before predicting it
+    monkeypatch.setattr(main, 'feature_key', swap_after(main.feature_key))
+    assert client.post('/predict', json=ORDER).json()['predicted_delivery_time_minutes'] == expected
+    monkeypatch.setattr(main, 'bundle', serving)
+    main.prediction_cache.clear()
+    monkeypatch.setattr(main, 'parse_created_at', swap_after(main.parse_created_at))
+    body = client.post('/predict/batch', json={'orders': [ORDER]}).json()
+    assert body['predictions'][0]['predicted_delivery_time_minutes'] == expected
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('tensorflow')
+
+import batch_score
+import main
+from conftest import BACKEND_DIR
+
+
+@pytest.fixture(scope='module')
+def orders_csv(data_path, tmp_path_factory):
+    df = pd.read_csv(data_path, nrows=500)
+    df.columns = df.columns.str.strip()
+    df = df.dropna(subset=['store_primary_category']).head(200)
+    path = tmp_path_factory.mktemp('orders') / 'orders.csv'
+    df.to_csv(path, index=False)
+    return str(path), df
+
+
+def test_batch_scores_match_predict_rows(orders_csv):
+    path, df = orders_csv
+    batch_score.init_worker(BACKEND_DIR, 'keras', 1)
+    header, ranges = batch_score.csv_chunks(path, 1 << 20)
+    out, stats = batch_score.score_chunk(path, (header, ranges[0][0], ranges[-1][1]), [])
+    scored = out[batch_score.PREDICTION_COLUMN].notna().to_numpy()
+    assert stats['rows'] == len(df) and scored.any()
+
+    serving = main.load_bundle(BACKEND_DIR)
+    rows = df[scored]
+    fields = [f for f in main.OrderInput.model_fields if f not in ('store_primary_category', 'created_at')]
+    # /predict receives the store category as a string, e.g. '4' for a CSV value of 4.0
+    orders = [main.OrderInput(store_primary_category=f"{row['store_primary_category']:g}",
+                              created_at=row['created_at'], **{f: row[f] for f in fields if f in row})
+              for _, row in rows.iterrows()]
+    hours, dayofweeks, _ = main.parse_created_at([o.created_at for o in orders])
+    expected = main.predict_rows(orders, hours, dayofweeks, serving)
+    np.testing.assert_allclose(out.loc[scored, batch_score.PREDICTION_COLUMN], expected, rtol=1e-4)
+
+
+def test_string_store_categories_are_encoded(shipped_preprocessor):
+    columns = main.conform_categoricals({'market_id': [1.0, 1.0], 'store_primary_category': ['4', '50'],
+                                         'order_protocol': [1.0, 1.0]}, shipped_preprocessor)
+    assert columns['store_primary_category'] == [4.0, 50.0]
+    encoded = shipped_preprocessor.transformers_[1][1].transform(pd.DataFrame(columns)[
+        ['market_id', 'store_primary_category', 'order_protocol']])
+    assert not np.array_equal(encoded[0], encoded[1])
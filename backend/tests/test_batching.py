@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def run_concurrently(batcher, items):
+    async def main():
+        return await asyncio.gather(*(batcher.submit(item) for item in items), return_exceptions=True)
+    try:
+        return asyncio.run(main())
+    finally:
+        batcher.close()
+
+
+def test_concurrent_items_are_coalesced_and_answered_in_order():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [2 * item for item in items]
+
+    results = run_concurrently(MicroBatcher(double, max_batch_size=4, max_wait_ms=50), range(10))
+    assert results == [2 * i for i in range(10)]
+    assert [len(c) for c in calls] == [4, 4, 2]
+
+
+def test_a_failing_item_only_fails_its_caller():
+    def check(items):
+        return [ValueError(f"bad {i}") if i == 2 else i for i in items]
+
+    results = run_concurrently(MicroBatcher(check, max_batch_size=8, max_wait_ms=5), range(4))
+    assert results[:2] == [0, 1] and results[3] == 3
+    assert isinstance(results[2], ValueError)
+
+
+def test_close_fails_pending_callers():
+    release = threading.Event()
+
+    def slow(items):
+        release.wait()
+        return items
+
+    batcher = MicroBatcher(slow, max_batch_size=1, max_wait_ms=1000)
+
+    async def main():
+        first = asyncio.ensure_future(batcher.submit('first'))   # flushed at once, blocks in slow()
+        await asyncio.sleep(0.01)
+        batcher.max_batch_size = 2
+        second = asyncio.ensure_future(batcher.submit('second'))  # waits for the timer
+        await asyncio.sleep(0.01)
+        release.set()
+        batcher.close()
+        with pytest.raises(RuntimeError, match="closed"):
+            await second
+        return await first
+
+    assert asyncio.run(main()) == 'first'
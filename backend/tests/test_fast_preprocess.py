@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_preprocess import CompiledPreprocessor, check_parity
+
+
+def feature_columns(preprocessor):
+    return list(preprocessor.transformers_[0][2]), list(preprocessor.transformers_[1][2])
+
+
+def data_rows(preprocessor, path, nrows=20000):
+    numeric, categorical = feature_columns(preprocessor)
+    df = pd.read_csv(path, nrows=nrows)
+    df.columns = df.columns.str.strip()
+    created_at = pd.to_datetime(df['created_at'], errors='coerce')
+    df['order_hour'] = created_at.dt.hour
+    df['order_dayofweek'] = created_at.dt.dayofweek
+    return df.dropna(subset=numeric + categorical)[numeric + categorical]
+
+
+def api_rows(preprocessor, n=5000):
+    """Rows as /predict builds them: Python scalars, the category as a string, unseen values mixed in."""
+    numeric, categorical = feature_columns(preprocessor)
+    categories = preprocessor.transformers_[1][1].categories_
+    rng = np.random.default_rng(0)
+    columns = {name: rng.normal(0, 1000, n).tolist() for name in numeric}
+    for name, cats in zip(categorical, categories):
+        values = list(cats) + [cats[0] + 1000 if cats.dtype.kind in 'if' else 'unseen']
+        columns[name] = rng.choice(np.array(values, dtype=cats.dtype), n).tolist()
+    columns['store_primary_category'] = [str(v) for v in columns['store_primary_category']]
+    return pd.DataFrame(columns)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_parity_on_training_data(shipped_preprocessor, data_path, dtype):
+    df = data_rows(shipped_preprocessor, data_path)
+    assert len(df) > 0
+    assert check_parity(shipped_preprocessor, CompiledPreprocessor(shipped_preprocessor, dtype=dtype), df)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_parity_on_api_rows(shipped_preprocessor, dtype):
+    df = api_rows(shipped_preprocessor)
+    assert check_parity(shipped_preprocessor, CompiledPreprocessor(shipped_preprocessor, dtype=dtype), df)
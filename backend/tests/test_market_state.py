@@ -0,0 +1,105 @@
+import json
+import math
+import threading
+import time
+
+import pytest
+
+from market_state import MarketStateStore
+
+NOW = 1_700_000_000.0
+
+
+def event(**fields):
+    return dict({'market_id': 1, 'total_onshift_partners': 40, 'total_busy_partners': 30,
+                 'total_outstanding_orders': 50, 'timestamp': NOW}, **fields)
+
+
+def test_rolling_mean_over_window():
+    store = MarketStateStore(window_seconds=300, n_buckets=30)
+    assert store.ingest(event(total_onshift_partners=40), now=NOW) == 'accepted'
+    assert store.ingest(event(total_onshift_partners=60, timestamp=NOW + 1), now=NOW + 1) == 'accepted'
+    assert store.mean(1, now=NOW + 1)['total_onshift_partners'] == 50
+    assert store.mean(1, now=NOW + 400) is None
+
+
+@pytest.mark.parametrize('value', [math.nan, math.inf, -math.inf, 'nan', -1])
+def test_non_finite_or_negative_values_are_rejected(value):
+    store = MarketStateStore()
+    store.ingest(event(), now=NOW)
+    assert store.ingest(event(total_busy_partners=value, timestamp=NOW + 1), now=NOW + 1) == 'invalid'
+
+    # The market still reads and serializes cleanly, and keeps taking events
+    state = store.mean(1, now=NOW + 1)
+    assert state['total_busy_partners'] == 30
+    json.dumps(store.markets(now=NOW + 1), allow_nan=False)
+    assert store.ingest(event(total_busy_partners=50, timestamp=NOW + 2), now=NOW + 2) == 'accepted'
+    assert store.mean(1, now=NOW + 2)['total_busy_partners'] == 40
+
+
+@pytest.mark.parametrize('field', ['market_id', 'timestamp'])
+def test_non_finite_keys_are_rejected(field):
+    assert MarketStateStore().ingest(event(**{field: math.nan}), now=NOW) == 'invalid'
+
+
+def test_future_timestamps_are_rejected():
+    store = MarketStateStore(window_seconds=300, max_skew_seconds=5)
+    assert store.ingest(event(total_onshift_partners=999, timestamp=NOW + 86400), now=NOW) == 'invalid'
+    assert store.mean(1, now=NOW) is None
+
+    # Real-time events are not stale afterwards
+    assert store.ingest(event(), now=NOW) == 'accepted'
+    assert store.ingest(event(total_onshift_partners=60, timestamp=NOW + 10), now=NOW + 10) == 'accepted'
+    assert store.mean(1, now=NOW + 10)['total_onshift_partners'] == 50
+
+
+def test_small_clock_skew_counts_as_now():
+    store = MarketStateStore(max_skew_seconds=5)
+    assert store.ingest(event(timestamp=NOW + 3), now=NOW) == 'accepted'
+    assert store.mean(1, now=NOW) is not None
+    assert store.ingest(event(timestamp=NOW + 1), now=NOW + 1) == 'accepted'
+
+
+def test_bounded_markets_evict_least_recently_updated():
+    store = MarketStateStore(max_markets=2)
+    for market_id, ts in ((1, NOW), (2, NOW + 1), (3, NOW + 2)):
+        store.ingest(event(market_id=market_id, timestamp=ts), now=NOW + 2)
+    assert sorted(store.markets(now=NOW + 2)) == [2.0, 3.0]
+    assert store.stats()['evicted'] == 1
+
+
+def test_update_racing_a_removal_lands_on_a_fresh_market():
+    store = MarketStateStore()
+    store.ingest(event(total_onshift_partners=40), now=NOW)
+    market = store._markets[1.0]
+    results = []
+    with market.lock:
+        writer = threading.Thread(target=lambda: results.append(
+            store.ingest(event(total_onshift_partners=60, timestamp=NOW + 1), now=NOW + 1)))
+        writer.start()
+        time.sleep(0.1)  # the writer has looked the market up and waits for its lock
+        market.removed = True  # what expire/evict do under the same lock
+        del store._markets[1.0]
+    writer.join()
+    assert results == ['accepted']
+    assert store.mean(1, now=NOW + 1)['total_onshift_partners'] == 60
+
+
+def test_counters_are_exact_under_concurrent_updates():
+    store = MarketStateStore(max_markets=8)
+    per_thread = 2000
+
+    def feed(offset):
+        for i in range(per_thread):
+            store.ingest(event(market_id=(offset + i) % 16, timestamp=NOW + (i % 3) - 400 * (i % 5 == 0)),
+                         now=NOW + 2)
+
+    threads = [threading.Thread(target=feed, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = store.stats()
+    assert stats['accepted'] + stats['stale'] + stats['invalid'] == 4 * per_thread
+    assert stats['stale'] == 4 * per_thread // 5
+    assert stats['markets'] <= 8
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from metrics import Registry, SamplingProfiler, stage, STAGE_SECONDS
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram('test_seconds', 'Test latency', ('stage',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, 'transform')
+    lines = registry.render().splitlines()
+    assert '# TYPE test_seconds histogram' in lines
+    assert 'test_seconds_bucket{stage="transform",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="transform",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{stage="transform",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{stage="transform"} 4' in lines
+
+
+def test_counter_and_stage_timer():
+    registry = Registry()
+    errors = registry.counter('test_errors_total', 'Errors', ('endpoint', 'type'))
+    errors.inc('/predict', 'ValueError')
+    errors.inc('/predict', 'ValueError', amount=2)
+    assert 'test_errors_total{endpoint="/predict",type="ValueError"} 3' in registry.render()
+
+    before = STAGE_SECONDS._values.get(('test_stage',), [None, 0.0, 0])[2]
+    with stage('test_stage'):
+        pass
+    assert STAGE_SECONDS._values[('test_stage',)][2] == before + 1
+
+
+def test_sampling_profiler(tmp_path):
+    profiler = SamplingProfiler(sample_every=0, out_dir=str(tmp_path), dump_every=2)
+    assert not any(profiler.should_sample() for _ in range(10))
+
+    profiler.configure(3)
+    assert [profiler.should_sample() for _ in range(6)] == [False, False, True] * 2
+    assert profiler.run(sum, [1, 2]) == 3
+    assert profiler.run(sum, [3]) == 3
+    assert profiler.status()['samples'] == 2
+    assert os.path.exists(tmp_path / f'predict-{os.getpid()}.prof')  # dumped every 2 samples
+
+
+def test_metrics_endpoint_reports_stages_and_errors():
+    pytest.importorskip('tensorflow')
+    from fastapi.testclient import TestClient
+    import main
+    from test_api import ORDER
+
+    with TestClient(main.app) as client:
+        main.prediction_cache.clear()
+        assert client.post('/predict', json=ORDER).status_code == 200
+        assert client.post('/predict', json={'market_id': 1.0}).status_code == 422
+        text = client.get('/metrics').text
+
+    for name in ('enrich', 'parse_created_at', 'cache_lookup', 'transform', 'model_predict', 'inference'):
+        assert f'porter_stage_duration_seconds_count{{stage="{name}"}}' in text
+    assert 'porter_requests_total{endpoint="/predict",status="200"}' in text
+    assert 'porter_errors_total{endpoint="/predict",type="RequestValidationError"}' in text
+    assert 'porter_model_load_seconds' in text
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import BACKEND_DIR
+from numpy_model import NumpyDenseModel, export_weights
+
+keras = pytest.importorskip('tensorflow').keras
+
+
+@pytest.fixture(scope='module')
+def models(tmp_path_factory):
+    model = keras.models.load_model(os.path.join(BACKEND_DIR, 'model.keras'))
+    path = str(tmp_path_factory.mktemp('numpy_model') / 'model.npz')
+    export_weights(model, path)
+    return model, NumpyDenseModel.load(path)
+
+
+def test_matches_keras_on_random_inputs(models):
+    model, engine = models
+    X = np.random.default_rng(0).normal(size=(4096, engine.input_dim)).astype(np.float32)
+    np.testing.assert_allclose(engine.predict(X), model.predict(X, batch_size=4096, verbose=0),
+                               rtol=1e-5, atol=1e-4)
+
+
+def test_matches_keras_on_training_rows(models, shipped_preprocessor, data_path):
+    from test_fast_preprocess import data_rows
+
+    model, engine = models
+    X = shipped_preprocessor.transform(data_rows(shipped_preprocessor, data_path, nrows=2000)).astype(np.float32)
+    # Single rows as /predict sends them, and the whole block as /predict/batch does
+    np.testing.assert_allclose(engine.predict(X[:1]), model.predict(X[:1], verbose=0), rtol=1e-5, atol=1e-4)
+    np.testing.assert_allclose(engine.predict(X), model.predict(X, batch_size=len(X), verbose=0),
+                               rtol=1e-5, atol=1e-4)
@@ -0,0 +1,22 @@
+import pandas as pd
+
+from order_features import parse_created_at
+
+
+def test_mixed_formats_fall_back_per_value():
+    values = ['2015-02-06 22:24:17', '2024-11-27T20:00:00Z', '2024-11-27T20:00:00+05:30',
+              'Feb 6 2015 10:24 PM', '06/02/2015 08:15', 'not a time', '']
+    hours, dayofweeks, errors = parse_created_at(values)
+
+    for i, value in enumerate(values[:5]):
+        # Each parsed row agrees with parsing the value on its own, as /predict does
+        expected = pd.to_datetime(value)
+        assert errors[i] is None
+        assert (hours[i], dayofweeks[i]) == (expected.hour, expected.dayofweek)
+    assert hours[3] == 22
+    assert errors[5] is not None and errors[6] is not None
+
+
+def test_iso_fast_path():
+    hours, dayofweeks, errors = parse_created_at(['2015-02-06 22:24:17', '2015-02-07T01:00:00'])
+    assert list(hours) == [22, 1] and list(dayofweeks) == [4, 5] and errors == [None, None]
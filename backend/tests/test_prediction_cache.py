@@ -0,0 +1,36 @@
+from prediction_cache import PredictionCache
+
+
+def test_version_change_invalidates_entries():
+    cache = PredictionCache(max_size=10)
+    cache.set_version('v1')
+    cache.put(('a',), 30.0, 'v1')
+    assert cache.get(('a',)) == 30.0
+
+    cache.set_version('v2')
+    assert cache.get(('a',)) is None
+    # A prediction computed by v1 that finishes after the swap is not stored
+    cache.put(('a',), 30.0, 'v1')
+    assert cache.get(('a',)) is None
+    cache.put(('a',), 35.0, 'v2')
+    assert cache.get(('a',)) == 35.0
+
+    cache.set_version('v2')  # same version: entries stay
+    assert cache.get(('a',)) == 35.0
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('prediction_cache.time.monotonic', lambda: clock[0])
+    cache = PredictionCache(max_size=2, ttl_seconds=10)
+    cache.put('a', 1.0)
+    cache.put('b', 2.0)
+    cache.get('a')
+    cache.put('c', 3.0)  # evicts b, the least recently used
+    assert cache.get('b') is None and cache.get('a') == 1.0
+
+    clock[0] += 11
+    assert cache.get('c') is None
+    stats = cache.stats()
+    assert stats['evictions'] == 2 and stats['hits'] == 2 and stats['misses'] == 2
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from prediction_log import ACTIVE_SUFFIX, FINISHED_SUFFIX, PredictionLog, read_prediction_logs
+
+
+def row(i):
+    return {'market_id': 1.0, 'created_at': f'2024-11-27T20:{i % 60:02d}:00Z', 'store_primary_category': '4',
+            'order_protocol': 1.0, 'total_items': 2, 'subtotal': 1500, 'num_distinct_items': 2,
+            'min_item_price': 500, 'max_item_price': 1000, 'total_outstanding_orders': 10.0,
+            'estimated_store_to_consumer_driving_duration': 400.0, 'order_hour': 20, 'order_dayofweek': 2,
+            'predicted_delivery_time_minutes': 38.2, 'model_version': 'v1', 'latency_ms': 1.5,
+            'endpoint': '/predict', 'logged_at': datetime.now(timezone.utc)}
+
+
+def test_buffered_rows_are_written_and_rotated(tmp_path):
+    log = PredictionLog(str(tmp_path), flush_rows=2, flush_seconds=60, rotate_bytes=1)
+    log.start()
+    assert log.record([row(0), row(1)]) == 0   # reaches flush_rows: wakes the writer
+    deadline = time.monotonic() + 5
+    while log.stats()['written'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert log.record([row(2)]) == 0           # written on close, to a new file
+    log.close()
+
+    finished = sorted(f for f in os.listdir(tmp_path) if f.endswith(FINISHED_SUFFIX))
+    assert len(finished) == 2 and not [f for f in os.listdir(tmp_path) if f.endswith(ACTIVE_SUFFIX)]
+    assert log.stats()['written'] == 3
+    df = read_prediction_logs([str(tmp_path)])
+    # In the training CSV's format, ready for train_model.py
+    assert sorted(df['created_at']) == ['2024-11-27 20:00:00', '2024-11-27 20:01:00', '2024-11-27 20:02:00']
+    assert df['actual_delivery_time'].isna().all()
+
+
+def test_full_buffer_drops_and_counts(tmp_path):
+    log = PredictionLog(str(tmp_path), buffer_size=3)
+    assert log.record([row(i) for i in range(2)]) == 0
+    assert log.record([row(i) for i in range(3)]) == 2
+    stats = log.stats()
+    assert (stats['buffered'], stats['queued'], stats['dropped']) == (3, 3, 2)
+
+
+def test_files_left_active_by_dead_processes_are_set_aside(tmp_path):
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+    dead = tmp_path / f'predictions-20240101-000000-{child.pid}-0{ACTIVE_SUFFIX}'
+    alive = tmp_path / f'predictions-20240101-000000-{os.getppid()}-0{ACTIVE_SUFFIX}'
+    dead.write_bytes(b'PAR1 no footer')
+    alive.write_bytes(b'PAR1 still being written')
+
+    log = PredictionLog(str(tmp_path))
+    log.start()
+    log.close()
+    assert not dead.exists() and (tmp_path / (dead.name + '.incomplete')).exists()
+    assert alive.exists()
+    assert read_prediction_logs([str(tmp_path)]).empty
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('tensorflow')  # train_model builds Keras models at import
+
+from order_features import conform_categoricals
+from train_model import (build_preprocessor, load_data, fill_missing, add_target_and_time_features,
+                         read_orders_csv)
+
+
+def store_encoded_fraction(preprocessor, df):
+    """Share of rows whose store_primary_category maps to a fitted one-hot column."""
+    _, encoder, columns = preprocessor.transformers_[1]
+    encoded = encoder.transform(df[columns])
+    sizes = [len(c) for c in encoder.categories_]
+    start = sum(sizes[:columns.index('store_primary_category')])
+    store = encoded[:, start:start + sizes[columns.index('store_primary_category')]]
+    return float((store.sum(axis=1) > 0).mean())
+
+
+def test_store_category_keeps_its_native_type(data_path):
+    assert read_orders_csv(data_path, nrows=100)['store_primary_category'].dtype.kind in 'iuf'
+
+
+def test_shipped_preprocessor_encodes_stores(shipped_preprocessor, data_path):
+    df = load_data(data_path)
+    df = add_target_and_time_features(fill_missing(df, {}, {}))
+    X = df[list(shipped_preprocessor.feature_names_in_)].dropna()
+    assert store_encoded_fraction(shipped_preprocessor, X) > 0.9
+    assert store_encoded_fraction(shipped_preprocessor, conform_categoricals(X, shipped_preprocessor)) > 0.9
+
+
+@pytest.mark.parametrize('fitted, served', [
+    (['4', '10', 'american'], [4, 10, 99]),
+    ([4, 10, 12], ['4', '10', 'american']),
+])
+def test_conform_categoricals_matches_the_fitted_type(fitted, served):
+    train = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'store_primary_category': fitted})
+    preprocessor = build_preprocessor(['x'], ['store_primary_category']).fit(train)
+    rows = conform_categoricals(pd.DataFrame({'x': [0.0] * 3, 'store_primary_category': served}), preprocessor)
+    encoded = preprocessor.transform(rows)[:, 1:]
+    np.testing.assert_array_equal(encoded.sum(axis=1), [1, 1, 0])
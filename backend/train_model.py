@@ -1,141 +1,443 @@
 import pandas as pd
 import numpy as np
-import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder
 from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
+import argparse
+import inspect
+import json
 import joblib
 import os
+import shutil
+import sys
+import time
+import feature_cache
+from numpy_model import export_weights, NumpyDenseModel, PRECISIONS
+from fast_preprocess import CompiledPreprocessor
+from serving_artifacts import export_artifacts
+from quantize import remove_variant
+from prediction_log import read_prediction_logs, log_files
+from embedding_model import (VOCABULARY_FILE, build_vocabulary, save_vocabulary, split_inputs,
+                             build_embedding_model, export_embedding_weights)
+from runtime_stats import rss_mb, peak_rss_mb
+from order_features import conform_categoricals
 
-# Load data
-print("Loading data...")
-df = pd.read_csv('data_2.csv')
-
-# Clean column names
-df.columns = df.columns.str.strip()
-print(f"Columns: {df.columns.tolist()}")
-
-# Check for missing columns
-required_cols = ['total_onshift_partners', 'total_busy_partners', 'total_outstanding_orders']
-missing_cols = [c for c in required_cols if c not in df.columns]
-if missing_cols:
-    print(f"MISSING COLUMNS: {missing_cols}")
-else:
-    print("All required columns present.")
-
-# --- Preprocessing ---
-print("Preprocessing...")
-
-# 1. Handle Missing Values (Simplified for robustness)
-# Fill numeric NaNs with median, categorical with mode or 'Unknown'
-numeric_features = ['total_items', 'subtotal', 'num_distinct_items', 'min_item_price', 
-                   'max_item_price', 'total_onshift_partners', 'total_busy_partners', 
-                   'total_outstanding_orders', 'estimated_store_to_consumer_driving_duration']
-categorical_features = ['market_id', 'store_primary_category', 'order_protocol']
-
-for col in numeric_features:
-    if col in df.columns:
-        df[col] = df[col].fillna(df[col].median())
-
-for col in categorical_features:
-    if col in df.columns:
-        df[col] = df[col].fillna(df[col].mode()[0])
-
-# 2. Feature Engineering
-# Convert timestamps
-df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
-df['actual_delivery_time'] = pd.to_datetime(df['actual_delivery_time'], errors='coerce')
-
-# Drop rows where timestamps are bad
-df = df.dropna(subset=['created_at', 'actual_delivery_time'])
-
-# Target: Delivery time in minutes
-df['delivery_time_minutes'] = (df['actual_delivery_time'] - df['created_at']).dt.total_seconds() / 60.0
-
-# Time features
-df['order_hour'] = df['created_at'].dt.hour
-df['order_dayofweek'] = df['created_at'].dt.dayofweek
-
-# Add new time features to numeric list for scaling
-numeric_features.extend(['order_hour', 'order_dayofweek'])
-
-# Filter outliers in target (optional but good for training stability)
-df = df[(df['delivery_time_minutes'] > 0) & (df['delivery_time_minutes'] < 200)]
-
-# Define X and y
-print(f"Columns before X selection: {df.columns.tolist()}")
-print(f"Numeric features: {numeric_features}")
-print(f"Categorical features: {categorical_features}")
-import sys; sys.stdout.flush()
-
-missing_in_X = [c for c in numeric_features + categorical_features if c not in df.columns]
-if missing_in_X:
-    print(f"WARNING: The following features are missing from df and will be dropped: {missing_in_X}")
-    for c in missing_in_X:
-        if c in numeric_features:
-            numeric_features.remove(c)
-        if c in categorical_features:
-            categorical_features.remove(c)
-
-print(f"Final Numeric features: {numeric_features}")
-print(f"Final Categorical features: {categorical_features}")
-
-X = df[numeric_features + categorical_features]
-y = df['delivery_time_minutes']
-
-# 3. Build Preprocessing Pipeline
-# Numeric: Standard Scaler
-# Categorical: OneHotEncoder
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', StandardScaler(), numeric_features),
-        ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), categorical_features)
-    ])
-
-# Split data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Fit preprocessor
-print("Fitting preprocessor...")
-X_train_processed = preprocessor.fit_transform(X_train)
-X_test_processed = preprocessor.transform(X_test)
-
-# Save preprocessor
-joblib.dump(preprocessor, 'preprocessor.joblib')
-print("Preprocessor saved to preprocessor.joblib")
-
-# --- Model Training ---
-print("Building model...")
-input_shape = X_train_processed.shape[1]
-
-model = keras.Sequential([
-    layers.Input(shape=(input_shape,)),
-    layers.Dense(128, activation='relu'),
-    layers.Dropout(0.2),
-    layers.Dense(64, activation='relu'),
-    layers.Dropout(0.1),
-    layers.Dense(32, activation='relu'),
-    layers.Dense(1, activation='linear')
-])
-
-model.compile(optimizer='adam', loss='mse', metrics=['mae'])
-
-print("Training model...")
-history = model.fit(
-    X_train_processed, y_train,
-    validation_split=0.2,
-    epochs=20,
-    batch_size=128,
-    verbose=1
-)
-
-# Evaluation
-loss, mae = model.evaluate(X_test_processed, y_test)
-print(f"Test MAE: {mae:.2f} minutes")
-
-# Save model
-model.save('model.keras')
-print("Model saved to model.keras")
+# Raw model inputs (order_hour and order_dayofweek are derived from created_at)
+NUMERIC_FEATURES = ['total_items', 'subtotal', 'num_distinct_items', 'min_item_price',
+                    'max_item_price', 'total_onshift_partners', 'total_busy_partners',
+                    'total_outstanding_orders', 'estimated_store_to_consumer_driving_duration']
+CATEGORICAL_FEATURES = ['market_id', 'store_primary_category', 'order_protocol']
+TIME_FEATURES = ['order_hour', 'order_dayofweek']
+TARGET = 'delivery_time_minutes'
+
+# Deliveries outside (0, MAX_DELIVERY_MINUTES) are treated as outliers
+MAX_DELIVERY_MINUTES = 200
+
+# Dataset schema, enforced when the CSV is read. Columns not listed here
+# (e.g. store_id) are not loaded. Counts and prices must be whole numbers
+# without gaps; the float32 columns may be missing. Categoricals are read as
+# their raw type and become pandas 'category' columns in load_data. A dtype of
+# None is left to pandas: store_primary_category holds integer codes in
+# data_2.csv (and the shipped preprocessor was fitted on them) but names in
+# other exports, so it must not be forced to one type.
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIMESTAMP_COLUMNS = ['created_at', 'actual_delivery_time']
+SCHEMA = {
+    'market_id': 'float64',
+    'store_primary_category': None,
+    'order_protocol': 'float64',
+    'total_items': 'int16',
+    'subtotal': 'int32',
+    'num_distinct_items': 'int16',
+    'min_item_price': 'int32',
+    'max_item_price': 'int32',
+    'total_onshift_partners': 'float32',
+    'total_busy_partners': 'float32',
+    'total_outstanding_orders': 'float32',
+    'estimated_store_to_consumer_driving_duration': 'float32',
+    'created_at': 'str',
+    'actual_delivery_time': 'str',
+}
+
+
+def read_orders_csv(path, **kwargs):
+    """``pd.read_csv`` restricted to the SCHEMA columns, with their declared (non-None) dtypes.
+
+    Header names are stripped of whitespace. Extra keyword arguments (e.g.
+    ``chunksize``) are passed through.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = {raw: raw.strip() for raw in header if raw.strip() in SCHEMA}
+    try:
+        reader = pd.read_csv(path, usecols=list(columns),
+                             dtype={raw: SCHEMA[name] for raw, name in columns.items() if SCHEMA[name]},
+                             **kwargs)
+    except ValueError as e:
+        raise ValueError(f"{path} does not match the dataset schema: {e}") from e
+    if isinstance(reader, pd.DataFrame):
+        return reader.rename(columns=columns)
+    return (chunk.rename(columns=columns) for chunk in reader)
+
+
+def holdout_rows(preprocessor, data_path='data_2.csv', test_size=0.2, random_state=42):
+    """The test split of ``data_path`` as raw rows for ``preprocessor``, and its targets.
+
+    Use this to score a saved model: its own preprocessor encodes the rows,
+    rather than one refitted on the data, whose columns can differ.
+    """
+    _, X_test, _, y_test = split_data(data_path, test_size, random_state)
+    missing = [c for c in preprocessor.feature_names_in_ if c not in X_test.columns]
+    if missing:
+        raise ValueError(f"{data_path} lacks columns the model uses: {missing}")
+    X_test = conform_categoricals(X_test[list(preprocessor.feature_names_in_)], preprocessor)
+    return X_test, y_test.to_numpy(dtype=np.float32)
+
+
+def parse_timestamps(values):
+    """Parse TIMESTAMP_FORMAT strings; anything else becomes NaT."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors='coerce')
+
+
+def load_data(path='data_2.csv', extra_paths=()):
+    print("Loading data...")
+    started, rss_before = time.perf_counter(), rss_mb()
+    df = read_orders_csv(path)
+    print(f"Columns: {df.columns.tolist()}")
+
+    # Labelled prediction logs from the API (rows without actual_delivery_time
+    # are dropped with the other bad timestamps)
+    if extra_paths:
+        logs = read_prediction_logs(extra_paths)
+        labelled = int(logs['actual_delivery_time'].notna().sum())
+        print(f"Prediction logs: {len(logs)} rows, {labelled} with actual_delivery_time")
+        logs = logs.reindex(columns=df.columns)
+        dtypes = df.dtypes.to_dict()
+        for col in CATEGORICAL_FEATURES:
+            if col in dtypes and dtypes[col].kind in 'iuf':
+                # The API logs categories as text; ones that are not numbers become missing
+                logs[col] = pd.to_numeric(logs[col], errors='coerce')
+                del dtypes[col]
+        logs = logs.astype(dtypes)
+        df = pd.concat([df, logs], ignore_index=True)
+
+    # Timestamps as datetime64 and categoricals as codes, instead of Python strings
+    for col in TIMESTAMP_COLUMNS:
+        df[col] = parse_timestamps(df[col])
+    for col in CATEGORICAL_FEATURES:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    print(f"Loaded {len(df)} rows in {time.perf_counter() - started:.2f}s: "
+          f"{df.memory_usage(deep=True).sum() / 2**20:.1f} MB in memory, "
+          f"RSS {rss_before:.1f} -> {rss_mb():.1f} MB (peak {peak_rss_mb():.1f} MB)")
+
+    # Check for missing columns
+    required_cols = ['total_onshift_partners', 'total_busy_partners', 'total_outstanding_orders']
+    missing_cols = [c for c in required_cols if c not in df.columns]
+    if missing_cols:
+        print(f"MISSING COLUMNS: {missing_cols}")
+    else:
+        print("All required columns present.")
+    return df
+
+
+def fill_missing(df, medians, modes):
+    """Fill numeric NaNs with the given medians and categoricals with modes."""
+    for col, value in medians.items():
+        if col in df.columns:
+            df[col] = df[col].fillna(value)
+    for col, value in modes.items():
+        if col in df.columns:
+            df[col] = df[col].fillna(value)
+    return df
+
+
+def add_target_and_time_features(df):
+    """Parse timestamps, derive the target and time features, drop outliers."""
+    for col in TIMESTAMP_COLUMNS:
+        df[col] = parse_timestamps(df[col])
+
+    # Drop rows where timestamps are bad
+    df = df.dropna(subset=['created_at', 'actual_delivery_time'])
+
+    # Target: Delivery time in minutes
+    df[TARGET] = ((df['actual_delivery_time'] - df['created_at']).dt.total_seconds() / 60.0).astype(np.float32)
+
+    # Time features
+    df['order_hour'] = df['created_at'].dt.hour.astype(np.int8)
+    df['order_dayofweek'] = df['created_at'].dt.dayofweek.astype(np.int8)
+
+    # Filter outliers in target (optional but good for training stability)
+    return df[(df[TARGET] > 0) & (df[TARGET] < MAX_DELIVERY_MINUTES)]
+
+
+def select_features(columns):
+    """Numeric (incl. time) and categorical features present in ``columns``."""
+    numeric_features = NUMERIC_FEATURES + TIME_FEATURES
+    categorical_features = list(CATEGORICAL_FEATURES)
+
+    missing_in_X = [c for c in numeric_features + categorical_features if c not in columns]
+    if missing_in_X:
+        print(f"WARNING: The following features are missing from df and will be dropped: {missing_in_X}")
+    numeric_features = [c for c in numeric_features if c in columns]
+    categorical_features = [c for c in categorical_features if c in columns]
+
+    print(f"Final Numeric features: {numeric_features}")
+    print(f"Final Categorical features: {categorical_features}")
+    return numeric_features, categorical_features
+
+
+def build_preprocessor(numeric_features, categorical_features, encoding='onehot'):
+    # Numeric: Standard Scaler
+    # Categorical: OneHotEncoder, or integer codes (-1 = unknown) for Embedding layers
+    if encoding == 'embedding':
+        categorical = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1,
+                                     encoded_missing_value=-1, dtype=np.float32)
+    else:
+        categorical = OneHotEncoder(handle_unknown='ignore', sparse_output=False, dtype=np.float32)
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), numeric_features),
+            ('cat', categorical, categorical_features)
+        ])
+
+
+def build_model(input_shape, units=(128, 64, 32), dropout=(0.2, 0.1, 0.0)):
+    """Dense regression network; the defaults are the production 128-64-32 model."""
+    stack = [layers.Input(shape=(input_shape,))]
+    for width, rate in zip(units, dropout):
+        stack.append(layers.Dense(width, activation='relu'))
+        if rate:
+            stack.append(layers.Dropout(rate))
+    stack.append(layers.Dense(1, activation='linear'))
+
+    model = keras.Sequential(stack)
+    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+    return model
+
+
+def save_artifacts(model, preprocessor, out_dir='.', vocabulary=None):
+    """Write preprocessor.joblib, model.keras, model.npz and artifacts/ to ``out_dir``.
+
+    Embedding models (``vocabulary`` given) also get vocabulary.json and no
+    artifacts/, which only holds Dense-only models.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    joblib.dump(preprocessor, os.path.join(out_dir, 'preprocessor.joblib'))
+    print("Preprocessor saved to preprocessor.joblib")
+
+    model.save(os.path.join(out_dir, 'model.keras'))
+    print("Model saved to model.keras")
+
+    npz_path = os.path.join(out_dir, 'model.npz')
+    vocabulary_path = os.path.join(out_dir, VOCABULARY_FILE)
+    if vocabulary is not None:
+        export_embedding_weights(model, npz_path)
+        save_vocabulary(vocabulary, out_dir)
+        print(f"Weights exported to model.npz, vocabulary to {VOCABULARY_FILE}")
+        # A previous one-hot model's artifacts would otherwise still be served
+        shutil.rmtree(os.path.join(out_dir, 'artifacts'), ignore_errors=True)
+    else:
+        # Flat weights for the TensorFlow-free NumPy serving engine
+        export_weights(model, npz_path)
+        print("Weights exported to model.npz")
+        if os.path.exists(vocabulary_path):
+            os.remove(vocabulary_path)
+
+        # Memory-mappable artifacts for PORTER_SERVING_MODE=production
+        export_artifacts(NumpyDenseModel.load(npz_path), CompiledPreprocessor(preprocessor),
+                         os.path.join(out_dir, 'artifacts'))
+        print("Serving artifacts written to artifacts/")
+
+    # Quantized variants of a previous model no longer match; quantize.py rebuilds them
+    for precision in PRECISIONS[1:]:
+        remove_variant(out_dir, precision)
+
+
+def split_data(data_path='data_2.csv', test_size=0.2, random_state=42, extra_paths=()):
+    """Load, clean and split the raw feature rows; returns (X_train, X_test, y_train, y_test).
+
+    Numerics are float32. The split is the one models are trained and evaluated on.
+    """
+    df = load_data(data_path, extra_paths)
+
+    # --- Preprocessing ---
+    print("Preprocessing...")
+
+    # 1. Handle Missing Values (Simplified for robustness)
+    medians = {c: df[c].median() for c in NUMERIC_FEATURES if c in df.columns}
+    modes = {c: df[c].mode()[0] for c in CATEGORICAL_FEATURES if c in df.columns}
+    df = fill_missing(df, medians, modes)
+
+    # 2. Feature Engineering
+    df = add_target_and_time_features(df)
+
+    # Define X and y
+    numeric_features, categorical_features = select_features(df.columns)
+    sys.stdout.flush()
+
+    X = df[numeric_features + categorical_features]
+    y = df[TARGET]
+
+    # Split data
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+    # Numerics go in as float32 and the encoders emit float32, so the
+    # matrices are float32 throughout, as Keras consumes them
+    X_train = X_train.astype({c: np.float32 for c in numeric_features})
+    X_test = X_test.astype({c: np.float32 for c in numeric_features})
+    return X_train, X_test, y_train, y_test
+
+
+def prepare_data(data_path='data_2.csv', test_size=0.2, random_state=42, extra_paths=(), encoding='onehot'):
+    """Load, clean, split and transform; returns (arrays, fitted preprocessor)."""
+    X_train, X_test, y_train, y_test = split_data(data_path, test_size, random_state, extra_paths)
+
+    # 3. Build Preprocessing Pipeline
+    categorical_features = [c for c in X_train.columns if c in CATEGORICAL_FEATURES]
+    numeric_features = [c for c in X_train.columns if c not in categorical_features]
+    preprocessor = build_preprocessor(numeric_features, categorical_features, encoding)
+
+    # Fit preprocessor
+    print("Fitting preprocessor...")
+    arrays = {
+        'X_train': preprocessor.fit_transform(X_train),
+        'X_test': preprocessor.transform(X_test),
+        'y_train': y_train.to_numpy(dtype=np.float32),
+        'y_test': y_test.to_numpy(dtype=np.float32),
+    }
+    print(f"Preprocessed: X_train {arrays['X_train'].shape} {arrays['X_train'].dtype}, "
+          f"RSS {rss_mb():.1f} MB (peak {peak_rss_mb():.1f} MB)")
+    return arrays, preprocessor
+
+
+def preprocessing_params(test_size=0.2, random_state=42, extra_paths=(), encoding='onehot'):
+    """Everything besides the data file that determines prepare_data's output."""
+    import sklearn
+    return {
+        'encoding': encoding,
+        'schema': SCHEMA,
+        'timestamp_format': TIMESTAMP_FORMAT,
+        'extra_data': [feature_cache.file_digest(f) for f in log_files(extra_paths)],
+        'numeric_features': NUMERIC_FEATURES,
+        'categorical_features': CATEGORICAL_FEATURES,
+        'time_features': TIME_FEATURES,
+        'max_delivery_minutes': MAX_DELIVERY_MINUTES,
+        'test_size': test_size,
+        'random_state': random_state,
+        'sklearn': sklearn.__version__,
+        'pandas': pd.__version__,
+        'code': [inspect.getsource(f) for f in (read_orders_csv, parse_timestamps, load_data, fill_missing, add_target_and_time_features,
+                                                select_features, build_preprocessor, split_data, prepare_data)],
+    }
+
+
+def prepare_data_cached(data_path='data_2.csv', cache_dir=None, test_size=0.2, random_state=42, key=None,
+                        extra_paths=(), encoding='onehot'):
+    """prepare_data, backed by a memory-mapped feature cache when cache_dir is set."""
+    if cache_dir is None:
+        return prepare_data(data_path, test_size, random_state, extra_paths, encoding)
+
+    started = time.perf_counter()
+    key = key or feature_cache.cache_key(
+        data_path, preprocessing_params(test_size, random_state, extra_paths, encoding))
+    cached = feature_cache.load(cache_dir, key)
+    if cached is not None:
+        print(f"Feature cache hit {key}: memory-mapped matrices in {time.perf_counter() - started:.2f}s")
+        return cached
+
+    print(f"Feature cache miss {key}")
+    arrays, preprocessor = prepare_data(data_path, test_size, random_state, extra_paths, encoding)
+    feature_cache.save(cache_dir, key, arrays, preprocessor, meta={'data_path': os.path.abspath(data_path)})
+    print(f"Feature cache written to {os.path.join(cache_dir, key)} in {time.perf_counter() - started:.2f}s")
+    return arrays, preprocessor
+
+
+def train(data_path='data_2.csv', epochs=20, batch_size=128, out_dir='.', cache_dir=None, extra_paths=(),
+          encoding='onehot', embedding_dim=8, report_path=None):
+    started = time.perf_counter()
+    arrays, preprocessor = prepare_data_cached(data_path, cache_dir, extra_paths=extra_paths, encoding=encoding)
+    X_train_processed, X_test_processed = arrays['X_train'], arrays['X_test']
+    y_train, y_test = arrays['y_train'], arrays['y_test']
+    print(f"X_train: {X_train_processed.shape}, {X_train_processed.nbytes / 2**20:.1f} MB")
+
+    # --- Model Training ---
+    print("Building model...")
+    vocabulary = None
+    if encoding == 'embedding':
+        vocabulary = build_vocabulary(preprocessor, embedding_dim)
+        model = build_embedding_model(vocabulary)
+        X_train_processed = list(split_inputs(X_train_processed, vocabulary))
+        X_test_processed = list(split_inputs(X_test_processed, vocabulary))
+    else:
+        model = build_model(X_train_processed.shape[1])
+
+    print("Training model...")
+    history = model.fit(
+        X_train_processed, y_train,
+        validation_split=0.2,
+        epochs=epochs,
+        batch_size=batch_size,
+        verbose=1
+    )
+
+    # Evaluation
+    loss, mae = model.evaluate(X_test_processed, y_test)
+    print(f"Test MAE: {mae:.2f} minutes")
+    print(f"Peak RSS: {peak_rss_mb():.1f} MB")
+
+    save_artifacts(model, preprocessor, out_dir, vocabulary)
+    if report_path:
+        report = {
+            'encoding': encoding,
+            'test_mae': float(mae),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'train_seconds': round(time.perf_counter() - started, 2),
+            'x_train_mb': round(arrays['X_train'].nbytes / 2**20, 2),
+            'n_features': int(arrays['X_train'].shape[1]),
+            'params': int(model.count_params()),
+            'first_dense_params': int(next(l for l in model.layers if type(l).__name__ == 'Dense').count_params()),
+            'model_keras_bytes': os.path.getsize(os.path.join(out_dir, 'model.keras')),
+            'model_npz_bytes': os.path.getsize(os.path.join(out_dir, 'model.npz')),
+        }
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return model, preprocessor
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the delivery time model")
+    parser.add_argument('--data', default='data_2.csv', help="Training CSV")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--out-dir', default='.', help="Where to write the model artifacts")
+    parser.add_argument('--feature-cache', metavar='DIR', default=None,
+                        help="Cache the transformed train/test matrices here and memory-map them on later runs")
+    parser.add_argument('--extra-data', metavar='PATH', action='append', default=[],
+                        help="Prediction log file or directory (prediction_logs/) to train on as well; repeatable")
+    parser.add_argument('--encoding', choices=['onehot', 'embedding'], default='onehot',
+                        help="Categorical encoding: dense one-hot columns, or integer codes into an Embedding layer")
+    parser.add_argument('--embedding-dim', type=int, default=8, help="Embedding width in --encoding embedding mode")
+    parser.add_argument('--report-json', metavar='PATH', default=None,
+                        help="Write test MAE, peak RSS and model sizes here (see encoding_report.py)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Read the CSV in chunks with bounded memory (see streaming_train.py)")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="Rows per chunk in --streaming mode")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.streaming and (args.extra_data or args.encoding != 'onehot'):
+        sys.exit("--extra-data and --encoding embedding are not supported with --streaming")
+    if args.streaming:
+        from streaming_train import train_streaming
+        train_streaming(args.data, epochs=args.epochs, batch_size=args.batch_size,
+                        chunksize=args.chunksize, out_dir=args.out_dir)
+    else:
+        train(args.data, epochs=args.epochs, batch_size=args.batch_size, out_dir=args.out_dir,
+              cache_dir=args.feature_cache, extra_paths=args.extra_data, encoding=args.encoding,
+              embedding_dim=args.embedding_dim, report_path=args.report_json)
@@ -1,62 +1,264 @@
-import fitz  # PyMuPDF
-import os
+"""Render the case study PDFs into images for the frontend graph gallery.
+
+    python extract_graphs.py [PDF ...] [--workers N] [--thumb-width 480] [--webp]
+
+Every page is rendered as ``<pdf-name>-p<page>.png`` in ``--output-dir``,
+and ``frontend/src/graphs.json`` lists them for the gallery. Pages are
+rendered in parallel across a process pool. A manifest records a content
+hash for each page (its content streams, Form XObjects, images, size and
+the render settings), and pages whose hash and files are unchanged are skipped, so
+after a small edit to a PDF only the edited pages are rendered again.
+"""
+import argparse
+import contextlib
+import hashlib
 import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import pymupdf as fitz  # PyMuPDF >= 1.24
+except ImportError:
+    import fitz  # PyMuPDF
 
-# Paths
-pdf_files = [
-    r"C:\Users\rattu\Downloads\PORTER_NN\Doc File\porter-neural-networks-regression.pdf",
-    r"C:\Users\rattu\Downloads\PORTER_NN\Doc File\Ratnesh_Porter_Case_Study.pdf"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PDFS = [
+    os.path.join(BASE_DIR, "Doc File", "porter-neural-networks-regression.pdf"),
+    os.path.join(BASE_DIR, "Doc File", "Ratnesh_Porter_Case_Study.pdf"),
 ]
-output_dir = r"C:\Users\rattu\Downloads\PORTER_NN\frontend\public\graphs"
+MANIFEST_VERSION = 2
+IMAGE_EXTENSIONS = ('.png', '.webp')
+
+# Per-worker cache of open documents
+_documents = {}
+
+
+def slug(pdf_path):
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    return re.sub(r'[^a-z0-9]+', '-', stem.lower()).strip('-')
+
+
+def page_name(pdf_path, page_number):
+    return f"{slug(pdf_path)}-p{page_number:03d}"
+
+
+def caption(page):
+    page_text = page.get_text("text").strip()
+    return page_text[:200].replace('\n', ' ') + "..." if len(page_text) > 200 else page_text
+
+
+def page_hashes(pdf_path, settings):
+    """Content hash of every page of ``pdf_path``, salted with the render settings."""
+    salt = json.dumps(settings, sort_keys=True).encode()
+    xref_digests = {}
+    hashes = []
+
+    def xref_digest(doc, xref, with_object=False):
+        # Shared images and forms are hashed once per document
+        if xref not in xref_digests:
+            digest = hashlib.sha256(doc.xref_stream_raw(xref) or b'')
+            if with_object:
+                digest.update(doc.xref_object(xref, compressed=True).encode())  # BBox, Matrix, Resources
+            xref_digests[xref] = digest.hexdigest()
+        return xref_digests[xref]
+
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            digest = hashlib.sha256(salt)
+            digest.update(repr((tuple(page.rect), page.rotation)).encode())
+            digest.update(page.read_contents())
+            # Charts are often drawn in Form XObjects (nested ones included here)
+            for xobject in page.get_xobjects():
+                digest.update(xref_digest(doc, xobject[0], with_object=True).encode())
+            for image in page.get_images(full=True):
+                digest.update(xref_digest(doc, image[0]).encode())
+            hashes.append(digest.hexdigest())
+    return hashes
+
+
+def output_files(name, settings):
+    """Variant -> file name for one page."""
+    files = {'src': f"{name}.png"}
+    if settings['webp']:
+        files['webp'] = f"{name}.webp"
+    if settings['thumb_width']:
+        files['thumb'] = f"{name}-thumb.{'webp' if settings['webp'] else 'png'}"
+    return files
+
 
-# Create output directory
-os.makedirs(output_dir, exist_ok=True)
+def temp_path(path):
+    """Sibling of ``path`` to write before renaming (keeps the extension for format detection)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.tmp-{os.getpid()}{ext}"
 
-graph_data = []
-image_count = 0
 
-for pdf_path in pdf_files:
-    if not os.path.exists(pdf_path):
-        print(f"File not found: {pdf_path}")
-        continue
-        
-    print(f"Processing {pdf_path}...")
+def save_pixmap(pix, path, quality):
+    """Write atomically: render to a temp file next to ``path``, then rename."""
+    tmp = temp_path(path)
     try:
-        doc = fitz.open(pdf_path)
-        for i in range(len(doc)):
-            page = doc[i]
-            
-            # Get text for context
-            page_text = page.get_text("text").strip()
-            caption = page_text[:200].replace('\n', ' ') + "..." if len(page_text) > 200 else page_text
-            
-            # Render the ENTIRE page to ensure we capture all graph elements (axes, legends, titles)
-            # Zoom = 2 for better resolution
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            
-            image_filename = f"page_{image_count}.png"
-            image_path = os.path.join(output_dir, image_filename)
-            
-            pix.save(image_path)
-            
-            graph_data.append({
-                "id": image_count,
-                "src": f"graphs/{image_filename}",
-                "context": caption,
-                "source_pdf": os.path.basename(pdf_path),
-                "page": i + 1
-            })
-            
-            print(f"Saved Page {i+1} as {image_filename}")
-            image_count += 1
-                    
-    except Exception as e:
-        print(f"Error processing {pdf_path}: {e}")
-
-# Save manifest
-manifest_path = r"C:\Users\rattu\Downloads\PORTER_NN\frontend\src\graphs.json"
-with open(manifest_path, "w") as f:
-    json.dump(graph_data, f, indent=2)
-
-print(f"Extraction complete. {image_count} graphs processed.")
-print(f"Manifest saved to {manifest_path}")
+        if path.endswith('.webp'):
+            pix.pil_save(tmp, format='WEBP', quality=quality)
+        else:
+            pix.save(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+
+def render_page(pdf_path, index, output_dir, settings):
+    """Render one page in a worker; returns its manifest entry (without the hash)."""
+    doc = _documents.get(pdf_path)
+    if doc is None:
+        doc = _documents[pdf_path] = fitz.open(pdf_path)
+    page = doc[index]
+    name = page_name(pdf_path, index + 1)
+    files = output_files(name, settings)
+
+    # Render the ENTIRE page to ensure we capture all graph elements (axes, legends, titles)
+    zoom = settings['zoom']
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    save_pixmap(pix, os.path.join(output_dir, files['src']), settings['quality'])
+    if 'webp' in files:
+        save_pixmap(pix, os.path.join(output_dir, files['webp']), settings['quality'])
+    if 'thumb' in files:
+        thumb_zoom = settings['thumb_width'] / page.rect.width
+        thumb = page.get_pixmap(matrix=fitz.Matrix(thumb_zoom, thumb_zoom))
+        save_pixmap(thumb, os.path.join(output_dir, files['thumb']), settings['quality'])
+
+    return {'source_pdf': os.path.basename(pdf_path), 'page': index + 1, 'files': files,
+            'context': caption(page)}
+
+
+def write_json_atomic(path, data):
+    """Write ``data`` as JSON through a temp file and rename; returns False if unchanged."""
+    text = json.dumps(data, indent=2)
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    tmp = temp_path(path)
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+    return True
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('pages', {})
+
+
+def extract(pdf_files, output_dir, graphs_json, manifest_path, settings, url_prefix='graphs', workers=None,
+            force=False):
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    previous = load_manifest(manifest_path)  # with force, still the fallback for failed renders
+
+    # Hash every page and queue the ones whose hash or files changed
+    pages, todo = {}, []
+    for pdf_path in pdf_files:
+        if not os.path.exists(pdf_path):
+            print(f"File not found: {pdf_path}")
+            # Keep what was rendered from it before, rather than dropping the pages
+            pages.update({k: v for k, v in previous.items() if v['source_pdf'] == os.path.basename(pdf_path)})
+            continue
+        try:
+            hashes = page_hashes(pdf_path, settings)
+        except Exception as e:
+            print(f"Error processing {pdf_path}: {e}")
+            pages.update({k: v for k, v in previous.items() if v['source_pdf'] == os.path.basename(pdf_path)})
+            continue
+        for index, digest in enumerate(hashes):
+            name = page_name(pdf_path, index + 1)
+            entry = previous.get(name)
+            if (not force and entry is not None and entry['hash'] == digest
+                    and all(os.path.exists(os.path.join(output_dir, f)) for f in entry['files'].values())):
+                pages[name] = entry
+            else:
+                todo.append((name, pdf_path, index, digest))
+        print(f"{pdf_path}: {len(hashes)} pages, {sum(1 for t in todo if t[1] == pdf_path)} to render")
+
+    failed = set()
+    if todo:
+        workers = workers or min(len(todo), os.cpu_count() or 1)
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(render_page, pdf_path, index, output_dir, settings): (name, digest)
+                       for name, pdf_path, index, digest in todo}
+            for future in as_completed(futures):
+                name, digest = futures[future]
+                try:
+                    pages[name] = dict(future.result(), hash=digest)
+                    print(f"Saved {name}")
+                except Exception as e:
+                    # Keep serving the last good render; its old hash makes the next run retry
+                    failed.add(name)
+                    if name in previous:
+                        pages[name] = previous[name]
+                    print(f"Error rendering {name}: {e}")
+
+    # Images no current page produces: removed pages and variants, outputs of
+    # older naming schemes (page_N.png) and temp files of interrupted runs.
+    # A page that failed to render still exists, so its images stay.
+    keep = {f for entry in pages.values() for f in entry['files'].values()}
+    keep.update(f for name in failed for f in output_files(name, settings).values())
+    for f in os.listdir(output_dir):
+        if f.lower().endswith(IMAGE_EXTENSIONS) and f not in keep:
+            os.remove(os.path.join(output_dir, f))
+            print(f"Removed {f}")
+
+    order = {os.path.basename(p): i for i, p in enumerate(pdf_files)}
+    names = sorted(pages, key=lambda n: (order.get(pages[n]['source_pdf'], len(order)), pages[n]['page']))
+    graph_data = []
+    for i, name in enumerate(names):
+        entry = pages[name]
+        item = {"id": i}
+        item.update({variant: f"{url_prefix}/{f}" for variant, f in entry['files'].items()})
+        item.update({"context": entry['context'], "source_pdf": entry['source_pdf'], "page": entry['page']})
+        graph_data.append(item)
+
+    write_json_atomic(manifest_path, {'format_version': MANIFEST_VERSION, 'settings': settings,
+                                      'pages': {n: pages[n] for n in names}})
+    changed = write_json_atomic(graphs_json, graph_data)
+    print(f"Extraction complete. {len(graph_data)} pages, {len(todo) - len(failed)} rendered"
+          f"{f', {len(failed)} failed' if failed else ''} in {time.perf_counter() - started:.2f}s.")
+    print(f"Gallery list {'saved to' if changed else 'unchanged:'} {graphs_json}")
+    return len(todo) - len(failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render PDF pages for the frontend graph gallery")
+    parser.add_argument('pdfs', nargs='*', default=DEFAULT_PDFS, help="Default: the two case study PDFs")
+    parser.add_argument('--output-dir', default=os.path.join(BASE_DIR, 'frontend', 'public', 'graphs'),
+                        help="Dedicated to the gallery: .png/.webp files no page produces are deleted")
+    parser.add_argument('--graphs-json', default=os.path.join(BASE_DIR, 'frontend', 'src', 'graphs.json'))
+    parser.add_argument('--manifest', default=os.path.join(BASE_DIR, 'frontend', 'graphs-manifest.json'),
+                        help="Page hashes from the last run")
+    parser.add_argument('--url-prefix', default='graphs', help="Path of OUTPUT_DIR as served by the frontend")
+    parser.add_argument('--zoom', type=float, default=2.0)
+    parser.add_argument('--thumb-width', type=int, default=0,
+                        help="Also write a downscaled copy this many pixels wide (0 = off)")
+    parser.add_argument('--webp', action='store_true', help="Also write WebP copies (needs Pillow)")
+    parser.add_argument('--quality', type=int, default=80, help="WebP quality")
+    parser.add_argument('--workers', type=int, default=None, help="Default: one per CPU")
+    parser.add_argument('--force', action='store_true', help="Ignore the manifest and render every page")
+    args = parser.parse_args()
+
+    if args.webp:
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            sys.exit("--webp needs Pillow: pip install pillow")
+    settings = {'zoom': args.zoom, 'thumb_width': args.thumb_width, 'webp': args.webp,
+                'quality': args.quality if args.webp else None, 'pymupdf': fitz.VersionBind}
+    extract(args.pdfs, args.output_dir, args.graphs_json, args.manifest, settings, args.url_prefix,
+            args.workers, args.force)
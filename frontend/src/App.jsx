@@ -79,15 +79,18 @@ function App() {
             graphImages.map((item) => (
               <div key={item.id} className="graph-card">
                 <div className="graph-image-container">
-                  <img
-                    src={`/${item.src}`}
-                    alt={`Analysis from ${item.source_pdf}`}
-                    onLoad={() => console.log(`Loaded: ${item.src}`)}
-                    onError={(e) => {
-                      console.error(`Failed to load: ${item.src}`)
-                      e.target.style.border = '2px solid red'
-                    }}
-                  />
+                  <a href={`/${item.src}`} target="_blank" rel="noreferrer">
+                    <img
+                      src={`/${item.thumb || item.webp || item.src}`}
+                      alt={`Analysis from ${item.source_pdf}`}
+                      loading="lazy"
+                      onLoad={() => console.log(`Loaded: ${item.src}`)}
+                      onError={(e) => {
+                        console.error(`Failed to load: ${item.src}`)
+                        e.target.style.border = '2px solid red'
+                      }}
+                    />
+                  </a>
                 </div>
                 <div className="graph-content">
                   <p className="graph-source">Source: {item.source_pdf} (Page {item.page})</p>